@@ -0,0 +1,45 @@
+import argparse
+import random
+import time
+
+from better_hive_service import TimestampCache, CompactTimestampCache
+
+
+def run(cache, keys, timestamps):
+    """Fill the cache, then read every key back; returns (set seconds, get seconds)."""
+    start = time.perf_counter()
+    for key, timestamp in zip(keys, timestamps):
+        cache.set(key, timestamp)
+    set_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cache.get_many(keys)
+    get_time = time.perf_counter() - start
+    return set_time, get_time
+
+
+def main():
+    """Compare memory use and speed of the dict and compact timestamp caches"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--keys", type=int, default=1000000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    keys = [
+        (f"SID{random.randrange(args.students)}", f"CSE{random.randrange(args.courses):03d}")
+        for _ in range(args.keys)
+    ]
+    timestamps = [random.randrange(1 << 31) for _ in keys]
+
+    for name, cache in (("dict", TimestampCache()), ("compact", CompactTimestampCache())):
+        set_time, get_time = run(cache, keys, timestamps)
+        usage = cache.memory_usage()
+        print(f"{name:>8}: {usage['entries']} keys, {usage['total'] / 2**20:.1f} MiB "
+              f"({usage['total'] / max(usage['entries'], 1):.0f} B/key), "
+              f"set {set_time:.2f}s, get_many {get_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,104 @@
-import ast
+import os
+import fcntl
+import shutil
+import json
+import sys
+from array import array
+import glob
+import time
+import uuid
+import threading
 import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 import pandas as pd
 from pyhive import hive
 from typing import List, Dict
 import csv
 
+# Delimited text layout used for files landed with LOAD DATA
+FIELD_DELIM = "\x01"
+COLLECTION_DELIM = "\x02"
+MAP_KEY_DELIM = "\x03"
+HIVE_NULL = "\\N"
+TEXT_ROW_FORMAT = """ROW FORMAT DELIMITED
+            FIELDS TERMINATED BY '\\001'
+            COLLECTION ITEMS TERMINATED BY '\\002'
+            MAP KEYS TERMINATED BY '\\003'
+            ESCAPED BY '\\\\'"""
+TEXT_TBLPROPERTIES = "'serialization.escape.crlf'='true'"
+DEFAULT_SPOOL_DIR = os.path.join(os.path.expanduser("~"), ".unilog", "hive_spool")
+
+
+def ensure_private_dir(path: str) -> str:
+    """
+    Create path (mode 0700) if needed and check that only the current user can use it.
+    
+    Raises:
+        PermissionError: If the directory belongs to another user or is open to others
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"Spool directory {path} is owned by another user")
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def _escape_text(value) -> str:
+    """Escape a scalar for a TEXTFILE table declared with TEXT_ROW_FORMAT."""
+    text = str(value)
+    for char in ("\\", FIELD_DELIM, COLLECTION_DELIM, MAP_KEY_DELIM):
+        text = text.replace(char, "\\" + char)
+    return text.replace("\n", "\\n").replace("\r", "\\r")
+
+
+def to_text_row(values) -> str:
+    """
+    Serialize one row for a TEXTFILE table declared with TEXT_ROW_FORMAT.
+    None becomes NULL, lists become ARRAYs and dicts become MAPs.
+    """
+    fields = []
+    for value in values:
+        if value is None:
+            fields.append(HIVE_NULL)
+        elif isinstance(value, dict):
+            fields.append(COLLECTION_DELIM.join(
+                f"{_escape_text(k)}{MAP_KEY_DELIM}{_escape_text(v)}" for k, v in value.items()
+            ))
+        elif isinstance(value, (list, tuple)):
+            fields.append(COLLECTION_DELIM.join(_escape_text(v) for v in value))
+        else:
+            fields.append(_escape_text(value))
+    return FIELD_DELIM.join(fields) + "\n"
+
+
+STORAGE_FORMATS = ("TEXTFILE", "ORC", "PARQUET")
+COMPRESSION_PROPERTY = {"ORC": "orc.compress", "PARQUET": "parquet.compression"}
+CACHE_BACKENDS = ("dict", "compact")
+
+
+def storage_clause(storage_format: str = "TEXTFILE", compression: str = None) -> tuple:
+    """
+    Build the storage part of a CREATE TABLE statement.
+    
+    Args:
+        storage_format (str): TEXTFILE, ORC or PARQUET
+        compression (str): Codec for ORC/PARQUET (e.g. SNAPPY, ZLIB, GZIP), None for the default
+        
+    Returns:
+        tuple: (row format and STORED AS clause, TBLPROPERTIES entries)
+    """
+    storage_format = storage_format.upper()
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unsupported storage format '{storage_format}', expected one of {STORAGE_FORMATS}")
+    if storage_format == "TEXTFILE":
+        return f"{TEXT_ROW_FORMAT}\n            STORED AS TEXTFILE", TEXT_TBLPROPERTIES
+    properties = f"'{COMPRESSION_PROPERTY[storage_format]}'='{compression.upper()}'" if compression else ""
+    return f"STORED AS {storage_format}", properties
+
+
 class HiveConnection:
     """
     Class to manage Hive database connections.
@@ -83,6 +177,97 @@ class HiveConnection:
         return self.cursor.description if self.cursor else None
 
 
+class HiveConnectionPool:
+    """
+    Pool of Hive connections with the HiveConnection interface.
+    
+    Every thread is bound to its own HiveConnection, opened on first use, so the
+    execute / fetch sequences of concurrent threads never share a cursor. The pool
+    holds one connection per thread using it (the HiveSystem workers and the caller).
+    SET statements are replayed on connections opened later.
+    """
+    def __init__(self, host='localhost', port=10000, database='default', username=''):
+        """
+        Initialize connection parameters for the pooled connections.
+        
+        Args:
+            host (str): Hive server host
+            port (int): Hive server port
+            database (str): Database name
+            username (str): Username for authentication
+        """
+        self.host = host
+        self.port = port
+        self.database = database
+        self.username = username
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._settings = []
+
+    def _connection(self) -> HiveConnection:
+        """Return the calling thread's connection, opening it if needed."""
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = HiveConnection(self.host, self.port, self.database, self.username)
+            conn.connect()
+            local.conn = conn
+            local.settings = set()
+            with self._lock:
+                self._connections.append(conn)
+        with self._lock:
+            pending = [setting for setting in self._settings if setting not in local.settings]
+        for setting in pending:
+            conn.execute(setting)
+            local.settings.add(setting)
+        return conn
+
+    def connect(self):
+        """Open the calling thread's connection"""
+        self._connection()
+        return True
+
+    def disconnect(self):
+        """Close every pooled connection; threads reconnect on their next query"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.disconnect()
+
+    def execute(self, query):
+        """
+        Execute a query on the calling thread's connection.
+        
+        Args:
+            query (str): The SQL query to execute
+            
+        Returns:
+            bool: Success status
+        """
+        conn = self._connection()
+        success = conn.execute(query)
+        if success and query.strip().upper().startswith("SET "):
+            with self._lock:
+                if query not in self._settings:
+                    self._settings.append(query)
+            self._local.settings.add(query)
+        return success
+
+    def fetch_one(self):
+        """Fetch one row from the calling thread's result set"""
+        return self._connection().fetch_one()
+
+    def fetch_all(self):
+        """Fetch all rows from the calling thread's result set"""
+        return self._connection().fetch_all()
+
+    def get_description(self):
+        """Get column descriptions from the calling thread's last query"""
+        return self._connection().get_description()
+
+
 class TimestampCache:
     """
     Class to manage timestamp caching for keys.
@@ -90,6 +275,7 @@ class TimestampCache:
     def __init__(self):
         """Initialize an empty timestamp cache."""
         self.cache = {}
+        self._lock = threading.RLock()
         
     def get(self, key_tuple: tuple, default=-1) -> int:
         """
@@ -112,53 +298,742 @@ class TimestampCache:
             key_tuple (tuple): The composite key
             timestamp (int): The timestamp value to set
         """
-        self.cache[key_tuple] = timestamp
+        with self._lock:
+            self.cache[key_tuple] = timestamp
         # print(f"Assigned timestamp for key {key_tuple} with value {timestamp}.")
         
-    def build_from_query(self, conn, table_name: str, prime_attr: List[str]) -> None:
+    def get_many(self, key_tuples, default=-1) -> List[int]:
+        """
+        Get the timestamps for several keys.
+        
+        Args:
+            key_tuples (list): Composite keys
+            default (int): Default value for keys not found
+            
+        Returns:
+            List[int]: Timestamps in the order of key_tuples
+        """
+        return [self.cache.get(key_tuple, default) for key_tuple in key_tuples]
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Estimate the bytes held by the cache (container, key tuples, key strings, timestamps).
+        Strings shared between keys are counted once.
+        """
+        container = sys.getsizeof(self.cache)
+        keys = 0
+        seen = set()
+        for key_tuple, time_stamp in self.cache.items():
+            keys += sys.getsizeof(key_tuple) + sys.getsizeof(time_stamp)
+            for component in key_tuple:
+                if id(component) not in seen:
+                    seen.add(id(component))
+                    keys += sys.getsizeof(component)
+        return {"entries": len(self.cache), "container": container, "keys": keys, "total": container + keys}
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def items(self):
+        """Return the (key_tuple, timestamp) pairs."""
+        with self._lock:
+            return list(self.cache.items())
+
+    def clear(self) -> None:
+        """Remove every cached timestamp."""
+        with self._lock:
+            self.cache.clear()
+
+    @staticmethod
+    def table_fingerprint(conn, table_name: str):
+        """
+        Fingerprint the table version from its metastore properties, which change
+        whenever data is inserted, loaded or overwritten.
+        
+        Args:
+            conn: HiveConnection instance
+            table_name (str): Table to fingerprint
+            
+        Returns:
+            dict or None: Fingerprint, or None if the properties are unavailable
+        """
+        if not conn.execute(f"SHOW TBLPROPERTIES {table_name}"):
+            return None
+        properties = {str(row[0]).strip(): str(row[1]).strip() for row in conn.fetch_all() if len(row) >= 2}
+        fingerprint = {
+            name: properties[name]
+            for name in ("transient_lastDdlTime", "numFiles", "numRows", "totalSize")
+            if name in properties
+        }
+        return fingerprint or None
+
+    def save_snapshot(self, path: str, table_name: str, prime_attr: List[str], fingerprint) -> bool:
+        """
+        Persist the cache to a JSON file in a private directory, tagged with the
+        table fingerprint. The file is written to a temporary name and then
+        atomically renamed.
+        
+        Returns:
+            bool: Success status
+        """
+        if fingerprint is None:
+            return False
+        try:
+            snapshot = {
+                "table": table_name,
+                "prime_attr": list(prime_attr),
+                "fingerprint": fingerprint,
+                "entries": [[list(key), int(time_stamp)] for key, time_stamp in self.items()],
+            }
+            directory = ensure_private_dir(os.path.dirname(os.path.abspath(path)))
+            fd, tmp_path = tempfile.mkstemp(prefix=".snapshot_", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            print(f"-----Saved timestamp cache snapshot ({len(self)} keys) to {path}")
+            return True
+        except Exception as e:
+            print(f"-----Failed to save timestamp cache snapshot: {e}")
+            return False
+
+    def load_snapshot(self, path: str, table_name: str, prime_attr: List[str], fingerprint) -> bool:
+        """
+        Load a snapshot if it was taken of the same table version.
+        
+        Returns:
+            bool: True if the cache was loaded from the snapshot
+        """
+        if fingerprint is None or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if (not isinstance(snapshot, dict) or snapshot.get("table") != table_name
+                    or snapshot.get("prime_attr") != list(prime_attr)
+                    or snapshot.get("fingerprint") != fingerprint):
+                print("-----Timestamp cache snapshot is stale; rebuilding from the table.")
+                return False
+            entries = self._parse_snapshot_entries(snapshot.get("entries"))
+            with self._lock:
+                self.clear()
+                for key, time_stamp in entries:
+                    self.set(key, time_stamp)
+            print(f"-----Timestamp cache loaded from snapshot ({len(self)} keys).")
+            return True
+        except Exception as e:
+            print(f"-----Ignoring unreadable timestamp cache snapshot {path}: {e}")
+            return False
+
+    @staticmethod
+    def _parse_snapshot_entries(entries) -> List[tuple]:
+        """
+        Validate snapshot entries: [[key components (str)], timestamp (int)] pairs.
+        
+        Raises:
+            ValueError: If an entry is malformed
+        """
+        if not isinstance(entries, list):
+            raise ValueError("snapshot entries are not a list")
+        parsed = []
+        for entry in entries:
+            if (not isinstance(entry, list) or len(entry) != 2 or not isinstance(entry[0], list)
+                    or not all(isinstance(component, str) for component in entry[0])
+                    or not isinstance(entry[1], int) or isinstance(entry[1], bool)):
+                raise ValueError(f"malformed snapshot entry {entry!r}")
+            parsed.append((tuple(entry[0]), entry[1]))
+        return parsed
+
+    def build_from_query(self, conn, table_name: str, prime_attr: List[str], snapshot_path: str = None) -> None:
         """
         Build cache from database query results.
         
+        The latest timestamp per key is aggregated by Hive (GROUP BY ... MAX).
+        With snapshot_path, a snapshot of the same table version is loaded instead
+        of querying, and a fresh snapshot is saved after querying.
+        
         Args:
             conn: HiveConnection instance
             table_name (str): Table to query
             prime_attr (list): List of key attribute names
+            snapshot_path (str): Local snapshot file, or None to always query
         """
         try:
-            group_by_cols = ", ".join(prime_attr + ['custom_timestamp'])
-            query = f"SELECT {group_by_cols} FROM {table_name}"
+            fingerprint = self.table_fingerprint(conn, table_name) if snapshot_path else None
+            if snapshot_path and self.load_snapshot(snapshot_path, table_name, prime_attr, fingerprint):
+                return
+
+            key_cols = ", ".join(prime_attr)
+            query = f"SELECT {key_cols}, MAX(custom_timestamp) FROM {table_name} GROUP BY {key_cols}"
             
             print(f"Executing timestamp cache init query: {query}")
             conn.execute(query)
             results = conn.fetch_all()
             
-            
-            for row in results:
-                key = tuple(str(val) for val in row[:-1])
-                time_stamp = row[-1]
-                val = self.get(key, -1)
-                if time_stamp > val:
-                    self.set(key, time_stamp)
+            with self._lock:
+                self.clear()
+                for row in results:
+                    key = tuple(str(val) for val in row[:-1])
+                    self.set(key, row[-1])
                     
             print("-----Timestamp cache initialized with dumped data.")
-            print(f"Cached {len(self.cache)} prime key combinations.")
+            print(f"Cached {len(self)} prime key combinations.")
+
+            if snapshot_path:
+                self.save_snapshot(snapshot_path, table_name, prime_attr, fingerprint)
             
         except Exception as e:
             print(f"-----Failed to build timestamp cache: {e}")
 
 
+class CompactTimestampCache(TimestampCache):
+    """
+    Timestamp cache for millions of keys with the same API as TimestampCache.
+    
+    Key components are dictionary-encoded (each distinct string is stored once and
+    replaced by a small integer id), the ids of a key are packed into one 64-bit
+    integer, and packed keys / timestamps live in two flat arrays forming an
+    open-addressing hash table with linear probing.
+    """
+    _EMPTY = -1
+    _MAX_LOAD = 0.7
+    _HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+    _MASK64 = (1 << 64) - 1
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Initialize an empty compact cache.
+        
+        Args:
+            capacity (int): Initial number of slots (rounded up to a power of two)
+        """
+        self._lock = threading.RLock()
+        self._reset(capacity)
+
+    def _reset(self, capacity: int) -> None:
+        self._arity = None
+        self._bits = None
+        self._ids = []      # per key position: value -> id
+        self._values = []   # per key position: id -> value
+        self._size = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self._capacity_bits = max(3, (max(capacity, 8) - 1).bit_length())
+        capacity = 1 << self._capacity_bits
+        self._keys = array('q', [self._EMPTY]) * capacity
+        self._timestamps = array('q', [0]) * capacity
+
+    def _slot(self, packed: int) -> int:
+        return ((packed * self._HASH_MULTIPLIER) & self._MASK64) >> (64 - self._capacity_bits)
+
+    def _pack(self, key_tuple: tuple, intern: bool):
+        """Encode a key as one integer, or return None if a component was never seen."""
+        if self._arity is None:
+            if not intern:
+                return None
+            self._arity = len(key_tuple)
+            self._bits = 63 // self._arity
+            self._ids = [{} for _ in range(self._arity)]
+            self._values = [[] for _ in range(self._arity)]
+        if len(key_tuple) != self._arity:
+            raise ValueError(f"Expected keys with {self._arity} components, got {key_tuple}")
+
+        packed = 0
+        for position, component in enumerate(key_tuple):
+            ids = self._ids[position]
+            component_id = ids.get(component)
+            if component_id is None:
+                if not intern:
+                    return None
+                component_id = len(self._values[position])
+                if component_id >> self._bits:
+                    raise OverflowError(f"Too many distinct values for key position {position}")
+                ids[component] = component_id
+                self._values[position].append(component)
+            packed |= component_id << (self._bits * position)
+        return packed
+
+    def _unpack(self, packed: int) -> tuple:
+        mask = (1 << self._bits) - 1
+        return tuple(
+            self._values[position][(packed >> (self._bits * position)) & mask]
+            for position in range(self._arity)
+        )
+
+    def _find(self, packed: int) -> int:
+        """Return the slot holding packed, or the empty slot where it belongs."""
+        keys = self._keys
+        mask = len(keys) - 1
+        slot = self._slot(packed)
+        while keys[slot] != self._EMPTY and keys[slot] != packed:
+            slot = (slot + 1) & mask
+        return slot
+
+    def _grow(self) -> None:
+        old_keys, old_timestamps = self._keys, self._timestamps
+        self._allocate(len(old_keys) * 2)
+        for packed, time_stamp in zip(old_keys, old_timestamps):
+            if packed != self._EMPTY:
+                slot = self._find(packed)
+                self._keys[slot] = packed
+                self._timestamps[slot] = time_stamp
+
+    def get(self, key_tuple: tuple, default=-1) -> int:
+        """
+        Get the timestamp for a key.
+        
+        Args:
+            key_tuple (tuple): The composite key
+            default (int): Default value if key not found
+            
+        Returns:
+            int: The timestamp value
+        """
+        with self._lock:
+            packed = self._pack(key_tuple, intern=False)
+            if packed is None:
+                return default
+            slot = self._find(packed)
+            return self._timestamps[slot] if self._keys[slot] != self._EMPTY else default
+
+    def get_many(self, key_tuples, default=-1) -> List[int]:
+        """
+        Get the timestamps for several keys.
+        
+        Args:
+            key_tuples (list): Composite keys
+            default (int): Default value for keys not found
+            
+        Returns:
+            List[int]: Timestamps in the order of key_tuples
+        """
+        return [self.get(key_tuple, default) for key_tuple in key_tuples]
+
+    def set(self, key_tuple: tuple, timestamp: int) -> None:
+        """
+        Set the timestamp for a key.
+        
+        Args:
+            key_tuple (tuple): The composite key
+            timestamp (int): The timestamp value to set
+        """
+        with self._lock:
+            packed = self._pack(key_tuple, intern=True)
+            slot = self._find(packed)
+            if self._keys[slot] == self._EMPTY:
+                if (self._size + 1) > self._MAX_LOAD * len(self._keys):
+                    self._grow()
+                    slot = self._find(packed)
+                self._keys[slot] = packed
+                self._size += 1
+            self._timestamps[slot] = int(timestamp)
+
+    def items(self):
+        """Iterate over (key_tuple, timestamp) pairs."""
+        with self._lock:
+            keys, timestamps = self._keys[:], self._timestamps[:]
+        # Component values are only ever appended, so unpacking needs no lock
+        for packed, time_stamp in zip(keys, timestamps):
+            if packed != self._EMPTY:
+                yield self._unpack(packed), time_stamp
+
+    def clear(self) -> None:
+        """Remove every cached timestamp."""
+        with self._lock:
+            self._reset(1024)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Estimate the bytes held by the cache (slot arrays and the key dictionaries).
+        """
+        container = sys.getsizeof(self._keys) + sys.getsizeof(self._timestamps)
+        keys = 0
+        for ids, values in zip(self._ids, self._values):
+            keys += sys.getsizeof(ids) + sys.getsizeof(values)
+            keys += sum(sys.getsizeof(value) for value in values)
+        return {"entries": self._size, "container": container, "keys": keys, "total": container + keys}
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class RowCache:
+    """
+    Bounded LRU cache of the latest rows per key, in front of HiveSystem.get.
+    
+    Every entry is tagged with the custom_timestamp of its row (-1 for a key
+    without rows). It is only served while the timestamp cache has no newer
+    version of the key, so a write that bypasses the row cache cannot be masked.
+    """
+    def __init__(self, capacity: int = 1024):
+        """
+        Initialize an empty row cache.
+        
+        Args:
+            capacity (int): Maximum number of cached keys (0 disables the cache)
+        """
+        self.capacity = max(0, capacity)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key_tuple: tuple, timestamp: int):
+        """
+        Get the cached rows of a key if they are at least as new as timestamp.
+        
+        Args:
+            key_tuple (tuple): The composite key
+            timestamp (int): Latest known version of the key (-1 if unknown)
+            
+        Returns:
+            list or None: Cached rows, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key_tuple)
+            if entry is None or entry[0] < timestamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key_tuple)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key_tuple: tuple, timestamp: int, rows) -> None:
+        """
+        Cache the rows of a key, evicting the least recently used keys.
+        
+        Args:
+            key_tuple (tuple): The composite key
+            timestamp (int): custom_timestamp of the rows (-1 if there are none)
+            rows (list): Latest rows of the key
+        """
+        if not self.capacity:
+            return
+        with self._lock:
+            current = self._entries.get(key_tuple)
+            if current is not None and current[0] > timestamp:
+                return
+            self._entries[key_tuple] = (timestamp, list(rows))
+            self._entries.move_to_end(key_tuple)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every cached row."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Return size, capacity, hits, misses, evictions and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class StagedFileLoader:
+    """
+    Class to land rows in Hive through local delimited files and LOAD DATA,
+    instead of one INSERT job (and one small file) per row.
+
+    Each loader stages its files in its own instance_* subdirectory of the private
+    spool_dir, held with an exclusive lock for the loader's lifetime. A subdirectory
+    whose lock is free belongs to a process that has exited; adopt_orphans() takes
+    over the files it left behind.
+    """
+    def __init__(self, conn, spool_dir: str = DEFAULT_SPOOL_DIR):
+        """
+        Initialize the loader.
+
+        Args:
+            conn: HiveConnection instance
+            spool_dir (str): Private local directory for staged files
+        """
+        self.conn = conn
+        self.base_dir = ensure_private_dir(spool_dir)
+        self.spool_dir = tempfile.mkdtemp(prefix=f"instance_{os.getpid()}_", dir=self.base_dir)
+        self._lock_file = self._acquire(self.spool_dir)
+        self._layouts = {}
+
+    @staticmethod
+    def _acquire(directory: str):
+        """Lock directory for this process; returns the lock file, or None if it is held."""
+        lock_file = open(os.path.join(directory, ".lock"), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except OSError:
+            lock_file.close()
+            return None
+
+    def adopt_orphans(self, *patterns: str) -> int:
+        """
+        Move the files matching any of patterns out of the directories of exited
+        loaders into this loader's directory, and remove those directories.
+        
+        Returns:
+            int: Number of adopted files
+        """
+        adopted = 0
+        for directory in glob.glob(os.path.join(self.base_dir, "instance_*")):
+            if directory == self.spool_dir or not os.path.isdir(directory):
+                continue
+            lock_file = self._acquire(directory)
+            if lock_file is None:
+                continue  # Owner is still running
+            try:
+                for pattern in patterns:
+                    for path in glob.glob(os.path.join(directory, pattern)):
+                        os.replace(path, os.path.join(self.spool_dir, os.path.basename(path)))
+                        adopted += 1
+                shutil.rmtree(directory, ignore_errors=True)
+            finally:
+                lock_file.close()
+        return adopted
+
+    def close(self) -> None:
+        """Release the instance directory; it is removed unless files are left to recover."""
+        if self._lock_file is None:
+            return
+        if os.listdir(self.spool_dir) == [".lock"]:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+        self._lock_file.close()
+        self._lock_file = None
+
+    def forget(self, table_name: str) -> None:
+        """Drop the cached layout of a table that was (re)created."""
+        self._layouts.pop(table_name, None)
+
+    def table_layout(self, table_name: str) -> Dict:
+        """
+        Describe a table: its data and partition columns and whether it is a
+        delimited TEXTFILE table.
+        
+        Returns:
+            dict: {"columns": [(name, type)], "partitions": [(name, type)], "text": bool}
+        """
+        if table_name in self._layouts:
+            return self._layouts[table_name]
+        if not self.conn.execute(f"DESCRIBE FORMATTED {table_name}"):
+            raise RuntimeError(f"Could not describe table {table_name}")
+
+        sections = {"columns": [], "partitions": []}
+        section = "columns"
+        text = False
+        for row in self.conn.fetch_all():
+            name = (row[0] or "").strip()
+            value = (row[1] or "").strip() if len(row) > 1 and row[1] else ""
+            if name.startswith("# Partition Information"):
+                section = "partitions"
+            elif name.startswith("# Detailed Table Information"):
+                section = None
+            elif section and name and not name.startswith("#"):
+                sections[section].append((name, value))
+            elif name == "InputFormat:":
+                text = value.endswith("TextInputFormat")
+
+        layout = {"columns": sections["columns"], "partitions": sections["partitions"], "text": text}
+        self._layouts[table_name] = layout
+        return layout
+
+    def new_path(self, prefix: str) -> str:
+        """Return a fresh path in the spool directory."""
+        return os.path.join(self.spool_dir, f"{prefix}_{int(time.time() * 1000)}_{uuid.uuid4().hex}.txt")
+
+    def write_file(self, rows, prefix: str) -> str:
+        """
+        Write rows to a new staged file.
+
+        Args:
+            rows: Iterable of value sequences
+            prefix (str): File name prefix
+
+        Returns:
+            str: Path of the staged file
+        """
+        path = self.new_path(prefix)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for row in rows:
+                f.write(to_text_row(row))
+        return path
+
+    def load_file(self, path: str, table_name: str, partition: Dict = None) -> bool:
+        """
+        Land a staged file in table_name and remove it once loaded.
+        
+        A delimited TEXTFILE table receives the file directly with LOAD DATA (no job).
+        Columnar (ORC/Parquet) tables are filled from a temporary TEXTFILE table with
+        one INSERT ... SELECT, which converts the rows.
+
+        Args:
+            path (str): Staged file
+            table_name (str): Target table
+            partition (dict): Partition column -> value for partitioned tables
+
+        Returns:
+            bool: Success status
+        """
+        layout = self.table_layout(table_name)
+        target = table_name
+        if partition:
+            target += " PARTITION (" + ", ".join(f"{col}={value}" for col, value in partition.items()) + ")"
+        if layout["text"]:
+            loaded = self.conn.execute(f"LOAD DATA LOCAL INPATH '{path}' INTO TABLE {target}")
+        else:
+            loaded = self._load_via_text_table(path, table_name, target, layout)
+        if not loaded:
+            print(f"-----Failed to load staged file {path} into {table_name}; keeping it for retry.")
+            return False
+        os.remove(path)
+        return True
+
+    def _load_via_text_table(self, path: str, table_name: str, target: str, layout: Dict) -> bool:
+        stage_table = f"{table_name}_stage_{uuid.uuid4().hex[:12]}"
+        row_format, properties = storage_clause("TEXTFILE")
+        column_defs = ", ".join(f"{name} {data_type}" for name, data_type in layout["columns"])
+        try:
+            return (
+                self.conn.execute(f"""
+                CREATE TABLE {stage_table} ({column_defs})
+                {row_format}
+                TBLPROPERTIES ({properties})
+                """)
+                and self.conn.execute(f"LOAD DATA LOCAL INPATH '{path}' INTO TABLE {stage_table}")
+                and self.conn.execute(f"INSERT INTO TABLE {target} SELECT * FROM {stage_table}")
+            )
+        finally:
+            self.conn.execute(f"DROP TABLE IF EXISTS {stage_table}")
+
+    def load_rows(self, rows, table_name: str, prefix: str) -> bool:
+        """Write rows to a staged file and load it into table_name."""
+        rows = list(rows)
+        if not rows:
+            return True
+        return self.load_file(self.write_file(rows, prefix), table_name)
+
+
 class OplogManager:
     """
     Class to manage operation logging.
+
+    Entries are appended to a local spool file and landed in the oplog table with
+    one LOAD DATA once flush_size entries are pending or flush_interval seconds
+    have passed. Spool files left over by an exited run are adopted and loaded
+    when the oplog table is created.
+
+    The oplog is partitioned by ts_bucket = custom_timestamp DIV bucket_size, so
+    incremental reads (get_oplog(since=...)) only scan the recent partitions.
     """
-    def __init__(self, conn):
+    def __init__(self, conn, spool_dir: str = DEFAULT_SPOOL_DIR, flush_size: int = 100, flush_interval: float = None,
+                 storage_format: str = "TEXTFILE", compression: str = None, loader: StagedFileLoader = None,
+                 bucket_size: int = 86400):
         """
         Initialize the operation log manager.
         
         Args:
             conn: HiveConnection instance
+            spool_dir (str): Private local directory for the spool files
+            flush_size (int): Number of pending entries that triggers a flush
+            flush_interval (float): Seconds after which pending entries are flushed on the next log call
+            storage_format (str): TEXTFILE, ORC or PARQUET for the oplog table
+            compression (str): Codec for ORC/PARQUET
+            loader (StagedFileLoader): Loader to share, one is created for spool_dir if omitted
+            bucket_size (int): Width of an oplog partition in timestamp units
         """
         self.conn = conn
+        self.bucket_size = max(1, int(bucket_size))
+        self.loader = loader if loader is not None else StagedFileLoader(conn, spool_dir)
+        self.storage_format = storage_format
+        self.compression = compression
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._spool_path = None
+        self._spool_file = None
+        self._pending = 0
+        self._last_flush = time.time()
+
+    def _spool_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.loader.spool_dir, "oplog_*.txt")))
+
+    def _bucket_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.loader.spool_dir, "oplog-b*.txt")))
+
+    @staticmethod
+    def _file_bucket(path) -> int:
+        return int(os.path.basename(path)[len("oplog-b"):].split("_", 1)[0])
+
+    def _split_by_bucket(self, path) -> None:
+        """Rewrite a spool file as one file per ts_bucket, then remove it."""
+        buckets = {}
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for line in f:
+                # custom_timestamp is the first field and never needs escaping
+                timestamp = line.split(FIELD_DELIM, 1)[0]
+                bucket = int(timestamp) // self.bucket_size if timestamp.lstrip("-").isdigit() else 0
+                buckets.setdefault(bucket, []).append(line)
+        for bucket, lines in buckets.items():
+            with open(self.loader.new_path(f"oplog-b{bucket}"), 'w', encoding='utf-8', newline='') as f:
+                f.writelines(lines)
+        os.remove(path)
+
+    def _is_partitioned(self) -> bool:
+        # Oplog tables created before partitioning keep working until recreated
+        try:
+            return bool(self.loader.table_layout("oplog")["partitions"])
+        except RuntimeError:
+            return False
+
+    def _append_to_spool(self, row) -> None:
+        if self._spool_file is None:
+            self._spool_path = self.loader.new_path("oplog")
+            self._spool_file = open(self._spool_path, 'w', encoding='utf-8', newline='')
+        self._spool_file.write(to_text_row(row))
+        self._spool_file.flush()
+        self._pending += 1
+
+    def flush(self) -> bool:
+        """
+        Land every pending oplog entry, including spool files left by an earlier run.
+        
+        Returns:
+            bool: Success status
+        """
+        with self._lock:
+            if self._spool_file is not None:
+                self._spool_file.close()
+                self._spool_file = None
+                self._spool_path = None
+            success = True
+            partitioned = self._is_partitioned()
+            for path in self._spool_files():
+                if partitioned:
+                    self._split_by_bucket(path)
+                else:
+                    success = self.loader.load_file(path, "oplog") and success
+            # One load per touched partition
+            for path in self._bucket_files():
+                partition = {"ts_bucket": self._file_bucket(path)} if partitioned else None
+                success = self.loader.load_file(path, "oplog", partition) and success
+            if success:
+                self._pending = 0
+            self._last_flush = time.time()
+            return success
 
         
     def create_oplog_table(self, recreate=False) -> bool:
@@ -174,22 +1049,42 @@ class OplogManager:
         try:
             if recreate:
                 self.conn.execute("DROP TABLE IF EXISTS oplog")
+                self.loader.forget("oplog")
                 print("Dropped existing oplog table.")
-
-            create_table_query = """
+                # Pending entries, ours and those spooled by an earlier run that exited
+                # before landing them, belonged to the dropped table
+                self.loader.adopt_orphans("oplog_*.txt", "oplog-b*.txt")
+                with self._lock:
+                    if self._spool_file is not None:
+                        self._spool_file.close()
+                        self._spool_file = None
+                    for path in self._spool_files() + self._bucket_files():
+                        os.remove(path)
+                    self._pending = 0
+
+            storage, properties = storage_clause(self.storage_format, self.compression)
+            create_table_query = f"""
             CREATE TABLE IF NOT EXISTS oplog (
                 custom_timestamp INT,
                 operation STRING,
                 table_name STRING,
-                keys ARRAY<STRING>,  -- Use array for keys
-                item ARRAY<STRING>   -- Use array for item
+                keys MAP<STRING, STRING>,  -- column -> value
+                item MAP<STRING, STRING>   -- column -> value
             )
-            STORED AS TEXTFILE
+            PARTITIONED BY (ts_bucket INT)  -- custom_timestamp DIV bucket_size
+            {storage}
             LOCATION '/home/sohith/Desktop/nosql/project/UniLog/hive/tmp/oplog/'
+            {f"TBLPROPERTIES ({properties})" if properties else ""}
             """
 
             self.conn.execute(create_table_query)
             print("-----Successfully created the oplog table.")
+
+            if not recreate:
+                # Recover entries spooled by an earlier run that exited before landing them
+                self.loader.adopt_orphans("oplog_*.txt", "oplog-b*.txt")
+                if self._spool_files() or self._bucket_files():
+                    self.flush()
             return True
             
         except Exception as e:
@@ -214,93 +1109,169 @@ class OplogManager:
             bool: Success status
         """
         try:
-            # Build the keys array (composite keys)
-            keys_array = [f"{key}: {val}" for key, val in zip(column_names[:len(key_tuple)], key_tuple)]
-
-            # Build the item array (set attributes and values)
-            if set_attrs is None and values is None:
-                item_array = []
-            else:
-                item_array = [f"{attr}: {val}" for attr, val in zip(set_attrs, values)]
-
-            # Hive insert query
-            insert_query = f"""
-            INSERT INTO oplog (custom_timestamp, operation, table_name, keys, item)
-            VALUES ({timestamp}, '{operation}', '{table_name}', 
-                    array({', '.join(f"'{k}'" for k in keys_array)}), 
-                    array({', '.join(f"'{i}'" for i in item_array)}))
-            """
-            
-            # Execute the insert query
-            self.conn.execute(insert_query)
-            print(f"-----Successfully logged operation to oplog: {keys_array}, {item_array}")
-            return True
+            row = self._build_row(operation, timestamp, table_name, key_tuple, column_names, set_attrs, values)
+            success = self._spool_rows([row])
+            print(f"-----Successfully logged operation to oplog: {row[3]}, {row[4]}")
+            return success
             
         except Exception as e:
             print(f"-----Error logging operation: {e}")
             return False
+
+    def log_entries(self, entries) -> bool:
+        """
+        Log a batch of operations; they reach the oplog table with one load.
+        
+        Args:
+            entries (list): Tuples of log_entry() arguments
+                            (operation, timestamp, table_name, key_tuple, column_names[, set_attrs, values])
+            
+        Returns:
+            bool: Success status
+        """
+        try:
+            rows = [self._build_row(*entry) for entry in entries]
+            success = self._spool_rows(rows)
+            print(f"-----Successfully logged {len(rows)} operations to oplog")
+            return success
+
+        except Exception as e:
+            print(f"-----Error logging operations: {e}")
+            return False
+
+    def _uses_array_layout(self) -> bool:
+        """True for a legacy oplog table whose keys/item are ARRAY<STRING> of "column: value"."""
+        try:
+            columns = dict(self.loader.table_layout("oplog")["columns"])
+        except RuntimeError:
+            return False
+        return columns.get("keys", "").lower().startswith("array")
+
+    def _build_row(self, operation, timestamp, table_name, key_tuple, column_names, set_attrs=None, values=None):
+        # Keys map (composite keys), keeping only column names (not table prefixes)
+        keys_map = {key.split('.')[-1]: str(val) for key, val in zip(column_names[:len(key_tuple)], key_tuple)}
+
+        # Item map (set attributes and values)
+        if set_attrs is None and values is None:
+            item_map = {}
+        else:
+            item_map = {attr.split('.')[-1]: str(val) for attr, val in zip(set_attrs, values)}
+
+        if self._uses_array_layout():
+            # Legacy tables keep receiving "column: value" strings until they are recreated
+            return (timestamp, operation, table_name,
+                    [f"{key}: {val}" for key, val in keys_map.items()],
+                    [f"{key}: {val}" for key, val in item_map.items()])
+        return (timestamp, operation, table_name, keys_map, item_map)
+
+    def _spool_rows(self, rows) -> bool:
+        """Spool rows; they are landed with the next flush, which runs here if it is due."""
+        with self._lock:
+            for row in rows:
+                self._append_to_spool(row)
+            due = self._pending >= self.flush_size or (
+                self.flush_interval is not None and time.time() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            return self.flush()
+        return True
             
-    def get_oplog(self) -> List[Dict]:
+    def get_oplog(self, since: int = None, operations=None) -> List[Dict]:
         """
-        Retrieve the oplog data.
+        Retrieve the oplog data, in timestamp order.
+        
+        Args:
+            since (int): Only return entries with a custom_timestamp greater than this
+            operations (iterable): Only return these operation types (e.g. ("SET",))
         
         Returns:
             List[Dict]: List of operation log entries
         """
         try:
+            # Pending entries must be visible to readers of the oplog
+            self.flush()
+
+            conditions = []
+            if since is not None:
+                since = int(since)
+                if self._is_partitioned():
+                    # Partition pruning: skip every bucket that ends before 'since'
+                    conditions.append(f"ts_bucket >= {since // self.bucket_size}")
+                conditions.append(f"custom_timestamp > {since}")
+            if operations is not None:
+                conditions.append("operation IN (" + ", ".join(f"'{op}'" for op in operations) + ")")
+            where_clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
             # Fetch oplog entries
-            self.conn.execute("SELECT * FROM oplog")
+            self.conn.execute(
+                f"SELECT custom_timestamp, operation, table_name, keys, item FROM oplog{where_clause} "
+                f"ORDER BY custom_timestamp"
+            )
             rows = self.conn.fetch_all()
 
-            oplog_data = []
-            for row in rows:
-                timestamp, operation, table_name, keys_str, item_str = row
-                
-                keys_dict = self._parse_key_value_list(keys_str)
-                items_dict = self._parse_key_value_list(item_str)
-
-                entry = {
-                    "timestamp": timestamp,
-                    "operation": operation,
-                    "table": table_name,
-                    "keys": keys_dict,
-                    "item": items_dict
-                }
-
-                oplog_data.append(entry)
-
-            return oplog_data
+            return self.rows_to_entries(rows)
 
         except Exception as e:
             print(f"-----Error fetching oplog data: {e}")
             return []
+
+    @classmethod
+    def rows_to_entries(cls, rows) -> List[Dict]:
+        """
+        Convert fetched oplog rows to entries.
+        
+        Hive returns MAP (and legacy ARRAY) columns as JSON text, decoded with
+        json.loads per value. Rows that cannot be decoded are reported and skipped
+        so that one bad row does not hide the rest of the oplog.
+        
+        Args:
+            rows (list): (custom_timestamp, operation, table_name, keys, item) rows
             
-            
-    def _parse_key_value_list(self, kv_list_str):
+        Returns:
+            List[Dict]: List of operation log entries
+        """
+        entries = []
+        for timestamp, operation, table_name, keys, item in rows:
+            try:
+                entries.append({
+                    "timestamp": timestamp,
+                    "operation": operation,
+                    "table": table_name,
+                    "keys": cls._decode_map(keys),
+                    "item": cls._decode_map(item),
+                })
+            except (ValueError, TypeError, AttributeError) as e:
+                print(f"-----Skipping undecodable oplog row at timestamp {timestamp}: {e}")
+        return entries
+
+    @classmethod
+    def _decode_map(cls, value) -> Dict:
+        """Decode one JSON map text (or an already decoded value / NULL) into a dictionary."""
+        if isinstance(value, str):
+            value = json.loads(value)
+        return cls._parse_key_value_list(value)
+
+    @staticmethod
+    def _parse_key_value_list(value) -> Dict:
         """
-        Parse a key-value list string into a dictionary, 
+        Normalize a decoded keys/item value into a dictionary, 
         keeping only column names (not table prefixes).
+        Also accepts the legacy ARRAY<STRING> of "column: value" strings.
         
         Args:
-            kv_list_str (str): String representation of key-value pairs
+            value: Decoded map, list of "column: value" strings, or None
             
         Returns:
             dict: Parsed key-value dictionary
         """
-        kv_dict = {}
-        try:
-            kv_list = ast.literal_eval(kv_list_str)
-            for pair in kv_list:
-                if ":" in pair:
-                    key, value = pair.split(":", 1)
-                    key = key.strip()
-                    # If key has a '.', keep only the part after the last '.'
-                    if '.' in key:
-                        key = key.split('.')[-1]
-                    kv_dict[key] = value.strip()
-        except Exception as e:
-            print(f"-----Error parsing keys/items: {e}")
-        return kv_dict
+        if not value:
+            return {}
+        if isinstance(value, dict):
+            pairs = value.items()
+        else:
+            pairs = [(key, val.strip()) for key, val in (pair.split(":", 1) for pair in value if ":" in pair)]
+        # If key has a '.', keep only the part after the last '.'
+        return {key.strip().split('.')[-1]: val for key, val in pairs}
 
 
 
@@ -308,14 +1279,21 @@ class TableManager:
     """
     Class to manage table operations.
     """
-    def __init__(self, conn):
+    def __init__(self, conn, storage_format: str = "TEXTFILE", compression: str = None,
+                 loader: StagedFileLoader = None):
         """
         Initialize table manager.
         
         Args:
             conn: HiveConnection instance
+            storage_format (str): TEXTFILE, ORC or PARQUET for data tables
+            compression (str): Codec for ORC/PARQUET
+            loader (StagedFileLoader): Loader whose cached table layouts are reset on recreate
         """
         self.conn = conn
+        self.storage_format = storage_format
+        self.compression = compression
+        self.loader = loader
         self.table_name = None
         self.all_columns = []
         
@@ -373,8 +1351,11 @@ class TableManager:
             # Drop tables if they exist
             self.conn.execute(f"DROP TABLE IF EXISTS {table_name}")
             self.conn.execute(f"DROP TABLE IF EXISTS {table_name}_staging")
+            if self.loader is not None:
+                self.loader.forget(table_name)
 
             # Create final table
+            storage, properties = storage_clause(self.storage_format, self.compression)
             create_table_query = f"""
             CREATE TABLE IF NOT EXISTS {table_name} (
                 student_id STRING,
@@ -384,8 +1365,9 @@ class TableManager:
                 grade STRING,
                 custom_timestamp INT
             )
-            STORED AS TEXTFILE
+            {storage}
             LOCATION '/home/sohith/Desktop/nosql/project/UniLog/hive/tmp/{table_name}/'
+            {f"TBLPROPERTIES ({properties})" if properties else ""}
             """
             print(f"Creating table: {create_table_query}")
             self.conn.execute(create_table_query)
@@ -416,11 +1398,14 @@ class TableManager:
             """
             self.conn.execute(load_data_query)
 
-            # Insert into final table with custom_timestamp = 0
+            # Insert into final table with custom_timestamp = 0, converting to its storage format.
+            # Columnar files are sorted by key so ORC/Parquet min/max statistics can skip stripes
+            sort_clause = "" if self.storage_format.upper() == "TEXTFILE" else "SORT BY student_id, course_id"
             insert_query = f"""
             INSERT INTO TABLE {table_name}
             SELECT student_id, course_id, roll_no, email_id, grade, 0
             FROM {table_name}_staging
+            {sort_clause}
             """
             self.conn.execute(insert_query)
 
@@ -434,14 +1419,52 @@ class TableManager:
             print(f"-----Error loading data: {e}")
             return False
 
+    def compact(self, key_columns: List[str]) -> bool:
+        """
+        Rewrite the active table so that it only holds the latest version
+        (highest custom_timestamp) of every key.
+        
+        Args:
+            key_columns (List[str]): Key attribute names
+            
+        Returns:
+            bool: Success status
+        """
+        columns = [col.split('.')[-1] for col in self.all_columns]
+        compact_query = f"""
+        INSERT OVERWRITE TABLE {self.table_name}
+        SELECT {", ".join(columns)}
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY {", ".join(key_columns)} ORDER BY custom_timestamp DESC
+            ) AS version_rank
+            FROM {self.table_name}
+        ) versions
+        WHERE version_rank = 1
+        """
+        if not self.conn.execute(compact_query):
+            print(f"-----Error compacting table '{self.table_name}'")
+            return False
+        print(f"-----Compacted table '{self.table_name}' to the latest version per key")
+        return True
+
 
 
 
 class HiveSystem:
     """
     Main system class integrating all components.
+
+    With workers > 1, operations submitted with submit_get / submit_set / get_many
+    run concurrently on a pool of Hive connections. Each key is routed to one
+    single-threaded worker, so operations on the same key keep their order while
+    unrelated keys overlap their Hive jobs.
     """
-    def __init__(self, host='localhost', port=10000, database='default'):
+    def __init__(self, host='localhost', port=10000, database='default',
+                 spool_dir=DEFAULT_SPOOL_DIR, oplog_flush_size=100, oplog_flush_interval=None,
+                 compaction_threshold=None, cache_snapshot=True, cache_backend="dict",
+                 storage_format="TEXTFILE", compression=None, oplog_bucket_size=86400, workers=1,
+                 row_cache_size=1024):
         """
         Initialize the Hive system.
         
@@ -449,37 +1472,288 @@ class HiveSystem:
             host (str): Hive server host
             port (int): Hive server port
             database (str): Database name
+            spool_dir (str): Private local directory for staged files and cache snapshots
+            oplog_flush_size (int): Pending oplog entries that trigger a flush
+            oplog_flush_interval (float): Seconds after which pending oplog entries are flushed
+            compaction_threshold (int): Appended row versions after which the table is compacted
+                                        automatically (None to compact only on demand)
+            cache_snapshot (bool): Persist the timestamp cache in spool_dir between runs
+            cache_backend (str): "dict" (TimestampCache) or "compact" (CompactTimestampCache)
+                                 for tables with millions of keys
+            storage_format (str): "TEXTFILE", "ORC" or "PARQUET" for the data table and the oplog
+            compression (str): Codec for ORC/PARQUET (e.g. "SNAPPY", "ZLIB")
+            oplog_bucket_size (int): Timestamp range covered by one oplog partition
+            workers (int): Worker threads (each with its own Hive connection) for submitted operations
+            row_cache_size (int): Keys kept in the LRU row cache in front of get() (0 to disable)
         """
-        self.connection = HiveConnection(host, port, database)
-        self.timestamp_cache = TimestampCache()
+        storage_clause(storage_format, compression)  # validate early
+        self.spool_dir = spool_dir
+        self.storage_format = storage_format.upper()
+        self.compression = compression
+        self.compaction_threshold = compaction_threshold
+        self.versions_since_compaction = 0
+        self.snapshot_dirty = False
+        self.cache_snapshot = cache_snapshot
+        self.oplog_flush_size = oplog_flush_size
+        self.oplog_flush_interval = oplog_flush_interval
+        self.oplog_bucket_size = oplog_bucket_size
+        self.connection = HiveConnectionPool(host, port, database)
+        self.workers = max(1, workers)
+        self._shards = []
+        self._futures = set()
+        self._futures_lock = threading.Lock()
+        self._versions_lock = threading.Lock()
+        self._worker_state = threading.local()
+        self._compaction_due = False
+        if cache_backend not in CACHE_BACKENDS:
+            raise ValueError(f"Unsupported cache backend '{cache_backend}', expected one of {CACHE_BACKENDS}")
+        self.timestamp_cache = CompactTimestampCache() if cache_backend == "compact" else TimestampCache()
+        self.row_cache = RowCache(row_cache_size)
         self.oplog_manager = None  # Initialize after connection
         self.table_manager = None  # Initialize after connection
+        self.loader = None  # Initialize after connection
+        self.prime_attr = []
         
     def connect(self):
         """Connect to Hive and initialize components"""
         self.connection.connect()
-        self.oplog_manager = OplogManager(self.connection)
-        self.table_manager = TableManager(self.connection)
+        self.loader = StagedFileLoader(self.connection, self.spool_dir)
+        self.oplog_manager = OplogManager(self.connection, self.spool_dir,
+                                          self.oplog_flush_size, self.oplog_flush_interval,
+                                          self.storage_format, self.compression, self.loader,
+                                          self.oplog_bucket_size)
+        self.table_manager = TableManager(self.connection, self.storage_format, self.compression, self.loader)
+        if self.storage_format != "TEXTFILE":
+            # Let key and timestamp predicates use the columnar min/max statistics
+            self.connection.execute("SET hive.optimize.ppd=true")
+            self.connection.execute("SET hive.optimize.index.filter=true")
+        self._shards = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"hive-worker-{i}")
+            for i in range(self.workers)
+        ]
         
     def disconnect(self):
-        """Disconnect from Hive"""
+        """Flush pending oplog entries and disconnect from Hive"""
+        self.wait()
+        for shard in self._shards:
+            shard.shutdown(wait=True)
+        self._shards = []
+        if self.oplog_manager is not None:
+            self.oplog_manager.flush()
+        if self.table_manager is not None and self.snapshot_dirty:
+            # Only our own writes changed the table, so the cache still matches it
+            self.save_timestamp_cache()
+        if self.loader is not None:
+            self.loader.close()
         self.connection.disconnect()
         
+    def _in_worker(self):
+        return getattr(self._worker_state, "active", False)
+
+    def _submit(self, key_tuple, fn, *args, **kwargs):
+        """Run fn on the worker that owns key_tuple and return its Future."""
+        if not self._shards:
+            raise RuntimeError("Not connected. Call connect() first.")
+        shard_index = hash(tuple(str(val) for val in key_tuple)) % len(self._shards)
+        return self._submit_to(shard_index, fn, *args, **kwargs)
+
+    def _submit_to(self, shard_index, fn, *args, **kwargs):
+        """Run fn on worker shard_index and return its Future."""
+        shard = self._shards[shard_index]
+
+        def run():
+            self._worker_state.active = True
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._worker_state.active = False
+
+        future = shard.submit(run)
+        with self._futures_lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard_future)
+        return future
+
+    def _discard_future(self, future):
+        with self._futures_lock:
+            self._futures.discard(future)
+
+    def submit_get(self, key_tuple, timestamp=None):
+        """Queue a GET on the key's worker; returns a Future of get()'s result"""
+        return self._submit(key_tuple, self.get, key_tuple, timestamp)
+
+    def submit_set(self, key_tuple, values, set_attrs, timestamp=None, log_operation=True):
+        """Queue a SET on the key's worker; returns a Future of set()'s result"""
+        return self._submit(key_tuple, self.set, key_tuple, values, set_attrs, timestamp, log_operation)
+
+    def get_many(self, key_tuples, timestamp=None, inline_limit=100, batch_size=1000):
+        """
+        Execute GET operations for several keys with one Hive query per batch.
+        
+        Keys held by the row cache are served from it. The others are split into
+        batches of batch_size keys, which run concurrently on the workers. A batch
+        of up to inline_limit keys is matched with an OR-list of key predicates,
+        a larger one with a join against a staged key table. Keys found in the
+        timestamp cache only match their latest version; for the others the newest
+        row is picked here. All GETs are logged with one oplog write.
+        
+        Args:
+            key_tuples (list): Composite keys
+            timestamp (int): Operation timestamp (logged for every key)
+            inline_limit (int): Largest batch resolved without a staged key table
+            batch_size (int): Keys per query; batches are spread over the workers
+            
+        Returns:
+            dict: key_tuple -> query results (the latest row, or [] if not found)
+        """
+        try:
+            if not self.table_manager.all_columns:
+                raise AttributeError("Table schema not set. Call set_table(table_name) first.")
+
+            # Read after the writes already submitted to the workers
+            self.wait()
+
+            requested = list(dict.fromkeys(tuple(key_tuple) for key_tuple in key_tuples))
+            if not requested:
+                return {}
+            str_keys = [tuple(str(val) for val in key_tuple) for key_tuple in requested]
+            cache_times = dict(zip(str_keys, self.timestamp_cache.get_many(str_keys)))
+            cached = {}
+            for key_tuple in str_keys:
+                rows = self.row_cache.get(key_tuple, cache_times[key_tuple])
+                if rows is not None:
+                    cached[key_tuple] = rows
+            key_versions = [
+                (key_tuple, cache_times[key_tuple] if cache_times[key_tuple] >= 0 else None)
+                for key_tuple in str_keys if key_tuple not in cached
+            ]
+
+            batch_size = max(1, batch_size)
+            batches = [key_versions[start:start + batch_size] for start in range(0, len(key_versions), batch_size)]
+            latest = {}
+            if len(batches) > 1 and len(self._shards) > 1:
+                futures = [
+                    self._submit_to(index % len(self._shards), self._get_batch, batch, inline_limit)
+                    for index, batch in enumerate(batches)
+                ]
+                for future in futures:
+                    latest.update(future.result())
+            else:
+                for batch in batches:
+                    latest.update(self._get_batch(batch, inline_limit))
+
+            for key_tuple, rows in cached.items():
+                if rows:
+                    latest[key_tuple] = rows[0]
+
+            if timestamp is not None:
+                self.oplog_manager.log_entries([
+                    ('GET', timestamp, self.table_manager.table_name, key_tuple, self.table_manager.all_columns)
+                    for key_tuple in requested
+                ])
+
+            print(f"Retrieved {len(latest)} of {len(requested)} keys")
+            return {
+                key_tuple: [latest[str_key]] if str_key in latest else []
+                for key_tuple, str_key in zip(requested, str_keys)
+            }
+
+        except Exception as e:
+            print(f"Error retrieving data: {e}")
+            return {}
+
+    def _get_batch(self, key_versions, inline_limit):
+        """
+        Resolve one batch of get_many with a single query and cache its rows.
+        
+        Args:
+            key_versions (list): (key_tuple, cached timestamp or None) pairs
+            inline_limit (int): Largest batch resolved without a staged key table
+            
+        Returns:
+            dict: key_tuple -> latest row, for the keys that were found
+        """
+        if len(key_versions) <= inline_limit:
+            rows = self._query_keys_inline(key_versions)
+        else:
+            rows = self._query_keys_staged(key_versions)
+
+        # Keep the latest version per key
+        key_count = len(key_versions[0][0])
+        columns = [col.split('.')[-1] for col in self.table_manager.all_columns]
+        timestamp_index = columns.index('custom_timestamp')
+        latest = {}
+        for row in rows:
+            key = tuple(str(val) for val in row[:key_count])
+            if key not in latest or row[timestamp_index] > latest[key][timestamp_index]:
+                latest[key] = row
+        for key_tuple, cache_time in key_versions:
+            if key_tuple in latest:
+                self.row_cache.put(key_tuple, latest[key_tuple][timestamp_index], [latest[key_tuple]])
+            else:
+                self.row_cache.put(key_tuple, -1 if cache_time is None else cache_time, [])
+        return latest
+
+    def wait(self):
+        """
+        Wait for every submitted operation, then run a compaction that became due meanwhile.
+        Synchronous calls are not ordered with submitted ones; call wait() in between.
+        """
+        if self._in_worker():
+            return
+        with self._futures_lock:
+            futures = list(self._futures)
+        wait_futures(futures)
+        if self._compaction_due:
+            self._compaction_due = False
+            self.compact()
+
     def set_table(self, table_name):
         """Set the active table"""
+        self.row_cache.clear()
         return self.table_manager.set_table(table_name)
         
     def load_data_from_csv(self, table_name, csv_file, recreate=False):
         """Load data from CSV file"""
+        if recreate:
+            self.row_cache.clear()
         return self.table_manager.load_data_from_csv(table_name,csv_file, recreate)
         
     def create_oplog_table(self, recreate=False):
         """Create oplog table"""
         return self.oplog_manager.create_oplog_table(recreate)
         
+    def _snapshot_path(self):
+        if not self.cache_snapshot or not self.table_manager.table_name:
+            return None
+        return os.path.join(self.spool_dir, f"timestamp_cache_{self.table_manager.table_name}.json")
+
     def build_timestamp_cache(self, prime_attr):
-        """Build timestamp cache from database"""
-        self.timestamp_cache.build_from_query(self.connection, self.table_manager.table_name, prime_attr)
+        """Build timestamp cache from database, or from a snapshot of the same table version"""
+        self.prime_attr = list(prime_attr)
+        self.timestamp_cache.build_from_query(self.connection, self.table_manager.table_name,
+                                              prime_attr, self._snapshot_path())
+
+    def row_cache_stats(self):
+        """Hit-rate metrics of the row cache"""
+        return self.row_cache.stats()
+
+    def _cache_row(self, key_tuple, row_values):
+        """Cache a freshly written row, given in table column order."""
+        columns = [col.split('.')[-1] for col in self.table_manager.all_columns]
+        row = tuple(row_values)
+        self.row_cache.put(tuple(str(val) for val in key_tuple), row[columns.index('custom_timestamp')], [row])
+
+    def save_timestamp_cache(self):
+        """Snapshot the timestamp cache against the current table version"""
+        path = self._snapshot_path()
+        if path is None or not self.prime_attr:
+            return False
+        fingerprint = TimestampCache.table_fingerprint(self.connection, self.table_manager.table_name)
+        saved = self.timestamp_cache.save_snapshot(path, self.table_manager.table_name, self.prime_attr, fingerprint)
+        if saved:
+            self.snapshot_dirty = False
+        return saved
     
     def get(self, key_tuple, timestamp=None):
         """
@@ -504,9 +1778,22 @@ class HiveSystem:
                 f"{col} = '{value}'" for col, value in zip(key_columns, key_tuple)
             )
 
-            query = f"SELECT * FROM {self.table_manager.table_name} WHERE {where_conditions}"
-            self.connection.execute(query)
-            result = self.connection.fetch_all()
+            # Read only the latest version of the key, from the row cache if it has it
+            str_key = tuple(str(val) for val in key_tuple)
+            cache_time = self.timestamp_cache.get(str_key, -1)
+            result = self.row_cache.get(str_key, cache_time)
+            if result is None:
+                if cache_time >= 0:
+                    query = (f"SELECT * FROM {self.table_manager.table_name} "
+                             f"WHERE {where_conditions} AND custom_timestamp = {cache_time}")
+                else:
+                    query = (f"SELECT * FROM {self.table_manager.table_name} "
+                             f"WHERE {where_conditions} ORDER BY custom_timestamp DESC LIMIT 1")
+                self.connection.execute(query)
+                result = self.connection.fetch_all()
+                columns = [col.split('.')[-1] for col in self.table_manager.all_columns]
+                row_time = result[0][columns.index('custom_timestamp')] if result else cache_time
+                self.row_cache.put(str_key, row_time, result)
 
             # Log the GET operation
             if timestamp is not None:
@@ -554,8 +1841,8 @@ class HiveSystem:
             value_columns = [col.split('.')[-1] for col in value_columns]
             all_columns = key_columns + value_columns + ['custom_timestamp']
 
-            if timestamp is None:
-                timestamp = 0
+            # Validated before any write so the timestamp cache cannot reject it after the INSERT
+            timestamp = 0 if timestamp is None else int(timestamp)
 
             req_columns = key_columns + ['custom_timestamp']
             req_tuple = key_tuple + (self.timestamp_cache.get(key_tuple, -1),)
@@ -600,7 +1887,9 @@ class HiveSystem:
             INSERT INTO {self.table_manager.table_name} ({", ".join(insert_columns)}) 
             VALUES ({", ".join("NULL" if v is None else f"'{v}'" for v in insert_values)})
             """
-            self.connection.execute(insert_query)
+            if not self.connection.execute(insert_query):
+                print(f"-----Error setting data: could not insert the new version of key {key_tuple}.")
+                return False
 
             # Log the operation if needed
             if log_operation:
@@ -616,6 +1905,8 @@ class HiveSystem:
 
             # Update timestamp cache
             self.timestamp_cache.set(key_tuple, timestamp)
+            self._cache_row(key_tuple, insert_values)
+            self._record_versions(1)
 
             print(f"-----Successfully set {set_attrs} = {values} for key {key_tuple} with timestamp {timestamp}")
             return True
@@ -624,17 +1915,235 @@ class HiveSystem:
             print(f"-----Error setting data: {e}")
             return False
     
-    def merge(self, system_name, external_oplog):
+    def compact(self, key_count=None):
+        """
+        Rewrite the data table to only the latest version per key.
+        
+        Args:
+            key_count (int): Number of leading key columns (defaults to the
+                             number of attributes the timestamp cache was built with)
+            
+        Returns:
+            bool: Success status
+        """
+        if not self.table_manager.all_columns:
+            raise AttributeError("Table schema not set. Call set_table(table_name) first.")
+        # The rewrite must not race with appends from the workers
+        self.wait()
+        key_columns = self.prime_attr if key_count is None else self._split_columns(key_count)[0]
+        if not key_columns:
+            raise AttributeError("Key attributes unknown. Call build_timestamp_cache(prime_attr) or pass key_count.")
+        success = self.table_manager.compact(key_columns)
+        if success:
+            self.versions_since_compaction = 0
+            self.snapshot_dirty = True
+        return success
+
+    def _record_versions(self, count):
+        """Count appended row versions and compact once the threshold is reached."""
+        with self._versions_lock:
+            self.versions_since_compaction += count
+            self.snapshot_dirty = True
+            due = (self.compaction_threshold is not None and self.prime_attr
+                   and self.versions_since_compaction >= self.compaction_threshold)
+        if due:
+            if self._in_worker():
+                # Workers cannot wait for each other; the next wait() compacts
+                self._compaction_due = True
+            else:
+                self.compact()
+
+    def _split_columns(self, key_count):
+        """Return (key_columns, value_columns) of the active table without table prefixes."""
+        columns = [col.split('.')[-1] for col in self.table_manager.all_columns if col.split('.')[-1] != 'custom_timestamp']
+        return columns[:key_count], columns[key_count:]
+
+    def _fetch_versions_staged(self, key_versions):
+        """
+        Fetch the rows of specific (key_tuple, custom_timestamp) versions with one
+        join against a staged key table.
+        
+        Args:
+            key_versions (list): (key_tuple, timestamp) pairs
+            
+        Returns:
+            dict: key_tuple -> row
+        """
+        if not key_versions:
+            return {}
+        key_count = len(key_versions[0][0])
+        return {tuple(str(val) for val in row[:key_count]): row for row in self._query_keys_staged(key_versions)}
+
+    def _query_keys_inline(self, key_versions):
+        """
+        Fetch the rows of several keys with an OR-list of key predicates.
+        A key with a known timestamp only matches that version.
+        
+        Args:
+            key_versions (list): (key_tuple, timestamp or None) pairs
+            
+        Returns:
+            list: Matching rows
+        """
+        key_columns, _ = self._split_columns(len(key_versions[0][0]))
+        predicates = []
+        for key_tuple, timestamp in key_versions:
+            conditions = [f"{col} = '{value}'" for col, value in zip(key_columns, key_tuple)]
+            if timestamp is not None:
+                conditions.append(f"custom_timestamp = {timestamp}")
+            predicates.append("(" + " AND ".join(conditions) + ")")
+        self.connection.execute(
+            f"SELECT * FROM {self.table_manager.table_name} WHERE {' OR '.join(predicates)}"
+        )
+        return self.connection.fetch_all()
+
+    def _query_keys_staged(self, key_versions):
+        """
+        Fetch the rows of several keys with one join against a staged key table.
+        A key with a known timestamp only matches that version.
+        
+        Args:
+            key_versions (list): (key_tuple, timestamp or None) pairs
+            
+        Returns:
+            list: Matching rows
+        """
+        key_count = len(key_versions[0][0])
+        key_columns, _ = self._split_columns(key_count)
+        stage_table = f"{self.table_manager.table_name}_keys_{uuid.uuid4().hex[:12]}"
+        table_name = self.table_manager.table_name
+
+        column_defs = ", ".join(f"{col} STRING" for col in key_columns)
+        self.connection.execute(f"""
+            CREATE TABLE {stage_table} ({column_defs}, custom_timestamp INT)
+            {TEXT_ROW_FORMAT}
+            STORED AS TEXTFILE
+            TBLPROPERTIES ({TEXT_TBLPROPERTIES})
+            """)
+        try:
+            rows = [tuple(key_tuple) + (timestamp,) for key_tuple, timestamp in key_versions]
+            if not self.loader.load_rows(rows, stage_table, "keys"):
+                raise RuntimeError(f"Could not stage keys into {stage_table}")
+
+            join_conditions = " AND ".join(f"t.{col} = s.{col}" for col in key_columns)
+            self.connection.execute(
+                f"SELECT t.* FROM {table_name} t JOIN {stage_table} s ON {join_conditions} "
+                f"WHERE s.custom_timestamp IS NULL OR t.custom_timestamp = s.custom_timestamp"
+            )
+            return self.connection.fetch_all()
+        finally:
+            self.connection.execute(f"DROP TABLE IF EXISTS {stage_table}")
+            self.loader.forget(stage_table)
+
+    def set_many(self, operations, log_operation=True):
+        """
+        Execute a batch of SET operations with a couple of Hive jobs.
+        
+        Last-writer-wins is resolved in Python against the timestamp cache, the
+        current versions of the affected keys are read with one staged join, and
+        the new row versions are landed with one LOAD DATA (plus one oplog load).
+        
+        Args:
+            operations (list): (key_tuple, values, set_attrs, timestamp) tuples
+            log_operation (bool): Whether to log the operations
+            
+        Returns:
+            int: Number of applied SET operations
+        """
+        try:
+            if not self.table_manager.all_columns:
+                raise AttributeError("Table schema not set. Call set_table(table_name) first.")
+
+            # Keep the batch ordered after operations already submitted to the workers
+            self.wait()
+
+            # Resolve duplicates of a key within the batch, newest timestamp wins
+            latest = {}
+            for key_tuple, values, set_attrs, timestamp in operations:
+                key_tuple = tuple(str(val) for val in key_tuple)
+                timestamp = 0 if timestamp is None else int(timestamp)
+                if key_tuple not in latest or timestamp >= latest[key_tuple][2]:
+                    latest[key_tuple] = (list(values), list(set_attrs), timestamp)
+
+            # Last writer wins against the timestamp cache
+            winners = {
+                key_tuple: op for key_tuple, op in latest.items()
+                if op[2] > self.timestamp_cache.get(key_tuple, -1)
+            }
+            skipped = len(latest) - len(winners)
+            if not winners:
+                print(f"-----Skipping batch. No SET is newer than the cached timestamps ({skipped} skipped).")
+                return 0
+
+            key_count = len(next(iter(winners)))
+            key_columns, value_columns = self._split_columns(key_count)
+            all_columns = key_columns + value_columns + ['custom_timestamp']
+
+            # Current versions, to preserve the columns a SET does not modify
+            existing = self._fetch_versions_staged([
+                (key_tuple, self.timestamp_cache.get(key_tuple, -1))
+                for key_tuple in winners if self.timestamp_cache.get(key_tuple, -1) >= 0
+            ])
+
+            delta_rows = []
+            log_entries = []
+            for key_tuple, (values, set_attrs, timestamp) in winners.items():
+                all_values_dict = dict(zip(key_columns, key_tuple))
+                for col in value_columns:
+                    all_values_dict[col] = None
+                existing_row = existing.get(key_tuple)
+                if existing_row:
+                    for col, val in zip(all_columns, existing_row):
+                        if col not in key_columns and col != 'custom_timestamp':
+                            all_values_dict[col] = val
+                for attr, val in zip(set_attrs, values):
+                    all_values_dict[attr] = val
+                all_values_dict['custom_timestamp'] = timestamp
+
+                delta_rows.append([all_values_dict[col] for col in all_columns])
+                log_entries.append(('SET', timestamp, self.table_manager.table_name, key_tuple,
+                                    self.table_manager.all_columns, set_attrs, values))
+
+            if not self.loader.load_rows(delta_rows, self.table_manager.table_name, "delta"):
+                print("-----Error setting data: could not load the delta file.")
+                return 0
+
+            if log_operation:
+                self.oplog_manager.log_entries(log_entries)
+
+            for (key_tuple, (_, _, timestamp)), row in zip(winners.items(), delta_rows):
+                self.timestamp_cache.set(key_tuple, timestamp)
+                self._cache_row(key_tuple, row)
+            self._record_versions(len(winners))
+
+            print(f"-----Successfully set {len(winners)} keys ({skipped} skipped as outdated)")
+            return len(winners)
+
+        except Exception as e:
+            print(f"-----Error setting data: {e}")
+            return 0
+    
+    def merge(self, system_name, external_oplog, bulk=True):
         """
         Merge with another system based on oplog.
         
+        In bulk mode the external log is reduced to one SET per key in Python:
+        entries not newer than the timestamp cache are dropped and the items of
+        the remaining ones are folded in timestamp order. The result is applied
+        with set_many, i.e. one staged load for the rows and one for the oplog.
+        
         Args:
             system_name (str): Name of system to merge with
-            external_oplog (list): Oplog entries from the external system
+            external_oplog (iterable): Oplog entries from the external system
+            bulk (bool): Apply the merge with set_many instead of one set() per entry
             
         Returns:
             bool: Success status
         """
+        # Order the merge after operations already submitted to the workers
+        self.wait()
+        if bulk:
+            return self._merge_bulk(system_name, external_oplog)
         try:
             # Example: Load oplog from external source (replace with real loader)
             # external_oplog = [{'timestamp': 1, 'operation': 'SET', 'table': '{table_name}', 'keys': {'student_id': 'SID103', 'course_id':'CSE016'}, 'item': {'grade': 'B'}}]
@@ -677,11 +2186,55 @@ class HiveSystem:
         except Exception as e:
             print(f"-----Error merging with {system_name}: {e}")
             return False
+
+    def _merge_bulk(self, system_name, external_oplog):
+        try:
+            table_name = self.table_manager.table_name
+            pending = {}
+            skipped = 0
+            for entry in external_oplog:
+                if entry["operation"] != "SET":
+                    continue  # Only SET operations affect state
+
+                table = entry.get("table", table_name)
+                if table != table_name:
+                    print(f"-----Table mismatch. Expected {table_name}, got {table}.")
+                    continue
+
+                keys = entry["keys"]
+                attribute_names = [col.split('.')[-1] for col in self.table_manager.all_columns[:len(keys)]]
+                key_tuple = tuple(str(keys[col]) for col in attribute_names)
+                timestamp = int(entry["timestamp"])
+                if timestamp <= self.timestamp_cache.get(key_tuple, -1):
+                    skipped += 1
+                    continue
+                pending.setdefault(key_tuple, []).append((timestamp, entry["item"]))
+
+            operations = []
+            for key_tuple, versions in pending.items():
+                versions.sort(key=lambda version: version[0])
+                item = {}
+                for _, version_item in versions:
+                    item.update(version_item)
+                operations.append((key_tuple, list(item.values()), list(item.keys()), versions[-1][0]))
+
+            applied_count = self.set_many(operations) if operations else 0
+            if operations and not applied_count:
+                # Every pending entry is newer than the cache, so nothing applied means set_many failed
+                print(f"-----Error merging with {system_name}: none of {len(operations)} newer SET operations could be applied.")
+                return False
+            print(f"-----Merge complete. Applied {applied_count} newer SET operations from {system_name} "
+                  f"({skipped} outdated entries skipped).")
+            return True
+
+        except Exception as e:
+            print(f"-----Error merging with {system_name}: {e}")
+            return False
     
     
-    def get_oplog(self):
-        """Get the operation log"""
-        return self.oplog_manager.get_oplog()
+    def get_oplog(self, since=None, operations=None):
+        """Get the operation log, optionally only entries after 'since' and of the given operations"""
+        return self.oplog_manager.get_oplog(since, operations)
     
     def make_csv(self, input_file: str, output_file: str):
         """
@@ -44,6 +44,17 @@ def parse_generic_op(operation_str: str):
 
     return None
 
+def merge_succeeded(result):
+    """
+    Whether a merge() result is clean. HIVE returns a bool, SQL the number of applied
+    rows, and MONGO a summary dict whose "failed" count must be zero.
+    """
+    if result is False or result is None:
+        return False
+    if isinstance(result, dict):
+        return result.get("failed", 0) == 0
+    return True
+
 def process_command(command: str, set_attr: list, systems,key):
     """
     Process a command string from external source.
@@ -66,8 +77,15 @@ def process_command(command: str, set_attr: list, systems,key):
         if merge_match:
             system_get = merge_match.group(1).upper()
             system_give = merge_match.group(2).upper()
-            systems[system_get].merge(system_give, systems[system_give].get_oplog())
-            return True
+            # Always the full log: entries a peer received through its own merges keep
+            # their original, possibly older, timestamps, so a timestamp watermark would skip them
+            if system_give == "MONGO":
+                other_oplog = systems[system_give].iter_oplog(operations=("SET",))
+            elif system_give == "HIVE":
+                other_oplog = systems[system_give].get_oplog(operations=("SET",))
+            else:
+                other_oplog = systems[system_give].get_oplog()
+            return merge_succeeded(systems[system_get].merge(system_give, other_oplog))
                 
 
         # Handle normal timestamped operations
@@ -145,7 +163,7 @@ def main():
     test_file = "testcase.in"
 
     hive_system = HiveSystem()
-    mongo_system = MongoService(recreate=recreate_mongo,table = table_name)
+    mongo_system = MongoService(recreate=recreate_mongo,table = table_name, key_fields=key)
     sql_system = SQL(table_name)
 
     systems = {
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import time
+
+import pymongo
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+
+from .mongo_service import OPLOG_PROJECTION, latest_remote_sets, report_log_write_error, set_log_entries
+
+
+class AsyncMongoService:
+    """
+    asyncio variant of MongoService with the same set_item / get_item / get_oplog / merge surface.
+    The oplog write and the data write of an operation are issued concurrently, and any number
+    of operations can be awaited concurrently from one event loop.
+
+    'client' is any Motor-compatible client (e.g. AsyncIOMotorClient, or an in-process fake
+    for tests). When omitted, an AsyncIOMotorClient is created from MONGO_URI.
+    """
+    def __init__(self, db_name="project", oplog_name="oplog", client=None):
+        if client is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            load_dotenv()
+            mongo_uri = os.environ.get("MONGO_URI")
+            if not mongo_uri:
+                raise EnvironmentError("MONGO_URI environment variable not set.")
+            client = AsyncIOMotorClient(mongo_uri)
+        self.client = client
+        self.db = self.client[db_name]
+        self.oplog_name = oplog_name
+
+    async def setup(self, table=None, key_fields=None):
+        """
+        Creates the oplog index used by merge() and, if given, the compound index on
+        the composite key fields of 'table'.
+        """
+        try:
+            await self.db[self.oplog_name].create_index(
+                [("operation", pymongo.ASCENDING), ("timestamp", pymongo.ASCENDING)]
+            )
+            if table and key_fields:
+                await self.db[table].create_index([(field, pymongo.ASCENDING) for field in key_fields])
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+    async def _log_operation(self, log_entry_or_entries):
+        entries = log_entry_or_entries if isinstance(log_entry_or_entries, list) else [log_entry_or_entries]
+        if not entries:
+            return
+        try:
+            await self.db[self.oplog_name].insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            report_log_write_error(e, entries, self.oplog_name)
+        except Exception as e:
+            print(f"Error logging operation(s) to '{self.oplog_name}': {e}")
+
+    def _get_timestamp(self):
+        return time.time()
+
+    async def set_item(self, keys, item, table="grades", timestamp=None, log=True):
+        """
+        Sets or updates an item in the specified MongoDB collection based on the key,
+        logging the operation concurrently. See MongoService.set_item.
+        """
+        collection = self.db[table]
+        try:
+            log_entry = {"timestamp": timestamp if timestamp else self._get_timestamp(), "operation": "SET", "table": table, "keys": keys, "item": item}
+            writes = [collection.update_one(keys, {"$set": item}, upsert=True)]
+            if log:
+                writes.append(self._log_operation(log_entry))
+            result = (await asyncio.gather(*writes))[0]
+            return result.upserted_id if result.upserted_id else result.modified_count
+        except Exception as e:
+            print(f"Error setting item in '{table}': {e}")
+            return None
+
+    async def get_item(self, keys, timestamp=None, table="grades", projection=None, log=True):
+        """
+        Retrieves a single item from the specified MongoDB collection based on the key,
+        logging the operation concurrently. See MongoService.get_item.
+        """
+        collection = self.db[table]
+        try:
+            log_entry = {"timestamp": timestamp if timestamp else self._get_timestamp(), "operation": "GET", "table": table, "keys": keys, "projection": projection}
+            reads = [collection.find_one(keys, projection)]
+            if log:
+                reads.append(self._log_operation(log_entry))
+            output = (await asyncio.gather(*reads))[0]
+            print("Rows fetched (MONGO):", output)
+            return output
+        except Exception as e:
+            print(f"Error getting item from '{table}': {e}")
+            return None
+
+    async def get_oplog(self, limit=None, query=None):
+        """
+        Retrieves entries from the oplog as a list, in timestamp order.
+        Returns None if an error occurred.
+        """
+        try:
+            cursor = self.db[self.oplog_name].find(query if query is not None else {}).sort('timestamp', pymongo.ASCENDING)
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            print(f"Error accessing oplog: {e}")
+            return None
+
+    async def iter_oplog(self, since=None, operations=None, batch_size=1000, projection=OPLOG_PROJECTION):
+        """
+        Lazily yields oplog entries in timestamp order. See MongoService.iter_oplog.
+        """
+        oplog_query = {}
+        if since is not None:
+            oplog_query["timestamp"] = {"$gt": since}
+        if operations is not None:
+            oplog_query["operation"] = {"$in": list(operations)}
+
+        cursor = self.db[self.oplog_name].find(oplog_query, projection, batch_size=batch_size)
+        try:
+            async for entry in cursor.sort('timestamp', pymongo.ASCENDING):
+                yield entry
+        finally:
+            await cursor.close()
+
+    async def merge(self, system_name, other_oplog, batch_size=1000):
+        """
+        Merge the oplog of another system into this one with last-writer-wins.
+        'other_oplog' may be a list or an (async) iterable of entries.
+        Winning SETs are applied in chunks of 'batch_size' with one bulk_write and
+        one oplog insert each. See MongoService.merge.
+
+        Returns:
+            dict: Counts of "applied", "skipped", "superseded" and "failed" entries,
+                  or False if the local oplog could not be read.
+        """
+        if hasattr(other_oplog, "__aiter__"):
+            other_oplog = [entry async for entry in other_oplog]
+        other_oplog = [dict(op, _source=system_name) for op in other_oplog if op.get('operation') == 'SET']
+
+        if len(other_oplog) == 0:
+            print("No operations found in the other oplog. Exiting.")
+            return {"applied": 0, "skipped": 0, "superseded": 0, "failed": 0}
+
+        start_timestamp = min(op.get('timestamp') for op in other_oplog)
+        oplog = await self.get_oplog(query={"operation": "SET", 'timestamp': {'$gte': start_timestamp}})
+        if oplog is None:
+            print(f"Could not retrieve MongoDB custom oplog '{self.oplog_name}' for merging.")
+            return False
+
+        by_table, superseded = latest_remote_sets(oplog, other_oplog)
+        winners = sum(len(operations) for operations in by_table.values())
+        summary = {"applied": 0, "skipped": len(other_oplog) - superseded - winners,
+                   "superseded": superseded, "failed": 0}
+
+        batches = [
+            self._apply_set_batch(table, operations[start:start + batch_size])
+            for table, operations in by_table.items()
+            for start in range(0, len(operations), batch_size)
+        ]
+        for applied, failed in await asyncio.gather(*batches):
+            summary["applied"] += applied
+            summary["failed"] += failed
+
+        print(f"Merge operation completed with {system_name} system: {summary}")
+        return summary
+
+    async def _apply_set_batch(self, table, operations):
+        """
+        Logs and applies a batch of SET entries on one collection concurrently.
+
+        Return Value: (applied, failed)
+        """
+        requests = [UpdateOne(op['keys'], {"$set": op['item']}, upsert=True) for op in operations]
+        try:
+            await asyncio.gather(
+                self._log_operation(set_log_entries(table, operations)),
+                self.db[table].bulk_write(requests, ordered=False),
+            )
+            return len(requests), 0
+        except BulkWriteError as e:
+            failed = len(e.details.get("writeErrors", []))
+            print(f"Error applying {failed} merged SET(s) to '{table}': {e.details.get('writeErrors')}")
+            return len(requests) - failed, failed
+        except Exception as e:
+            print(f"Error applying merged SETs to '{table}': {e}")
+            return 0, len(requests)
+
+    def close(self):
+        """
+        Closes the MongoDB connection.
+        """
+        if self.client:
+            self.client.close()
+            self.client = None
+            print("AsyncMongoService connection closed.")
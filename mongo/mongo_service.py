@@ -1,14 +1,98 @@
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import BulkWriteError
 import pymongo
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 import os
 from dotenv import load_dotenv
 import pandas as pd
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+
+
+DUPLICATE_KEY_ERROR = 11000
+# Fields of the unified operation log format
+OPLOG_PROJECTION = {"_id": 0, "timestamp": 1, "operation": 1, "table": 1, "keys": 1, "item": 1}
+OPLOG_MODES = ("capped", "uncapped")
+
+
+def set_log_entries(table, operations):
+    """Builds the oplog entries for a batch of SET operations on 'table'."""
+    return [
+        {"timestamp": op['timestamp'], "operation": "SET", "table": table, "keys": op['keys'], "item": op['item']}
+        for op in operations
+    ]
+
+
+def report_log_write_error(error, entries, oplog_name):
+    """
+    Reports a BulkWriteError raised by an unordered oplog insert_many. Duplicate
+    entries are expected on re-merges and are only noted; anything else is an error.
+    """
+    write_errors = error.details.get("writeErrors", [])
+    duplicates = [err for err in write_errors if err.get("code") == DUPLICATE_KEY_ERROR]
+    for err in duplicates:
+        print(f"Skipped duplicate log entry with timestamp: {entries[err['index']].get('timestamp')}")
+    if len(duplicates) != len(write_errors):
+        print(f"Error logging operation(s) to '{oplog_name}': {error.details}")
+
+
+def latest_remote_sets(local_oplog, other_oplog):
+    """
+    Last-writer-wins reduction of the local SETs and the remote SETs (tagged with
+    '_source'), keyed by (keys, table).
+
+    Return Value: (winning remote entries grouped by table, number of remote entries
+                   superseded by a newer remote entry for the same key)
+    """
+    latest_remote = {}
+    for entry in other_oplog:
+        key = (tuple(sorted(entry['keys'].items())), entry['table'])
+        if key not in latest_remote or entry['timestamp'] > latest_remote[key]['timestamp']:
+            latest_remote[key] = entry
+    superseded = len(other_oplog) - len(latest_remote)
+
+    latest_entries = {}
+    for entry in local_oplog:
+        key = (tuple(sorted(entry['keys'].items())), entry['table'])
+        if key in latest_remote and (key not in latest_entries or entry['timestamp'] > latest_entries[key]['timestamp']):
+            latest_entries[key] = entry
+
+    by_table = {}
+    for key, entry in latest_remote.items():
+        # Ties go to the local state
+        if key not in latest_entries or entry['timestamp'] > latest_entries[key]['timestamp']:
+            by_table.setdefault(entry['table'], []).append(entry)
+    return by_table, superseded
 
 
 class MongoService:
-    def __init__(self, db_name="project", oplog_name="oplog", table=None, recreate=False):
+    def __init__(self, db_name="project", oplog_name="oplog", table=None, recreate=False,
+                 log_buffer_size=1, log_flush_interval=None,
+                 oplog_mode="uncapped", oplog_size=1048576, oplog_ttl=None, key_fields=None):
+        """
+        'log_buffer_size' is the number of oplog entries buffered before they are written
+        with one insert_many. The default of 1 writes every entry immediately.
+        'log_flush_interval' (seconds) additionally flushes a non-empty buffer in the background.
+
+        'oplog_mode' is "capped" (bounded to 'oplog_size' bytes, oldest entries are evicted)
+        or "uncapped" (kept until 'oplog_ttl' seconds have passed, or forever if None;
+        see compact_oplog()). 'key_fields' are the composite key fields of 'table',
+        which get a compound index.
+        """
+        if oplog_mode not in OPLOG_MODES:
+            raise ValueError(f"oplog_mode must be one of {OPLOG_MODES}, got '{oplog_mode}'")
+        if oplog_mode == "capped" and oplog_ttl:
+            raise ValueError("A TTL cannot be used with a capped oplog.")
+        self.oplog_mode = oplog_mode
+        self.oplog_size = oplog_size
+        self.oplog_ttl = oplog_ttl
+        self.log_buffer_size = max(1, log_buffer_size)
+        self.log_flush_interval = log_flush_interval
+        self._log_buffer = []
+        self._log_lock = threading.Lock()
+        self._flush_stop = threading.Event()
+        self._flush_thread = None
         load_dotenv()
         mongo_uri = os.environ.get("MONGO_URI")
         if not mongo_uri:
@@ -29,37 +113,148 @@ class MongoService:
                     print(f"Collection '{table}' already exists. Deleting existing...")
                     self.drop_collection(table_name=table)
                     self.load_data(table_name=table)
-            
-            # Create the capped collection
-            # if recreate is True:
 
-                self.db.create_collection(
-                    self.oplog_name,
-                    capped=True,
-                    size=1048576,  # Maximum size of the collection in bytes (e.g., 1MB)
-                )
-
-                print(f"Capped collection '{self.oplog_name}' created successfully.")
+            self._ensure_oplog()
+            if table and key_fields:
+                self.db[table].create_index([(field, pymongo.ASCENDING) for field in key_fields])
+            self.oplog_retention()
 
         except Exception as e:
             print(f"An error occurred: {e}")
 
-    def load_data(self, csv_file_path="./dataset/student_course_grades_head.csv", table_name="grades"):
+        if self.log_buffer_size > 1 and self.log_flush_interval:
+            self._flush_thread = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flush_thread.start()
+
+    def _ensure_oplog(self):
+        """
+        Creates the oplog collection in the configured mode if it does not exist,
+        and the indexes used by merge(), oplog_retention() and the TTL.
+        """
+        if self.oplog_name not in self.db.list_collection_names():
+            if self.oplog_mode == "capped":
+                self.db.create_collection(self.oplog_name, capped=True, size=self.oplog_size)
+                print(f"Capped collection '{self.oplog_name}' ({self.oplog_size} bytes) created successfully.")
+            else:
+                self.db.create_collection(self.oplog_name)
+                print(f"Collection '{self.oplog_name}' created successfully.")
+        else:
+            is_capped = bool(self.db[self.oplog_name].options().get("capped"))
+            if is_capped != (self.oplog_mode == "capped"):
+                print(f"Warning: existing oplog '{self.oplog_name}' is {'capped' if is_capped else 'uncapped'}, "
+                      f"but oplog_mode is '{self.oplog_mode}'. Recreate it to change the mode.")
+
+        oplog = self.db[self.oplog_name]
+        oplog.create_index([("operation", pymongo.ASCENDING), ("timestamp", pymongo.ASCENDING)])
+        # Serves the oldest / newest lookups of oplog_retention() without a collection scan
+        oplog.create_index([("timestamp", pymongo.ASCENDING)])
+        if self.oplog_ttl:
+            oplog.create_index("logged_at", expireAfterSeconds=int(self.oplog_ttl))
+
+    def oplog_retention(self):
+        """
+        Reports the effective retention window of the oplog: its mode, size limit
+        and the oldest / newest timestamps still stored. A capped oplog that is full
+        has evicted every entry older than the oldest timestamp reported.
+        """
+        oplog = self.db[self.oplog_name]
+        options = oplog.options()
+        oldest = oplog.find_one({}, {"timestamp": 1}, sort=[("timestamp", pymongo.ASCENDING)])
+        newest = oplog.find_one({}, {"timestamp": 1}, sort=[("timestamp", pymongo.DESCENDING)])
+        report = {
+            "mode": "capped" if options.get("capped") else "uncapped",
+            "max_size": options.get("size"),
+            "ttl": self.oplog_ttl,
+            "entries": oplog.estimated_document_count(),
+            "oldest_timestamp": oldest["timestamp"] if oldest else None,
+            "newest_timestamp": newest["timestamp"] if newest else None,
+        }
+        try:
+            report["size"] = self.db.command("collStats", self.oplog_name).get("size")
+        except Exception:
+            report["size"] = None
+
+        print(f"Oplog '{self.oplog_name}' retention: {report}")
+        if report["max_size"] and report["size"] and report["size"] >= 0.9 * report["max_size"]:
+            print(f"Warning: capped oplog '{self.oplog_name}' is near its {report['max_size']} byte limit; "
+                  f"entries older than timestamp {report['oldest_timestamp']} are no longer available for merges.")
+        return report
+
+    def compact_oplog(self, drop_gets=True):
+        """
+        Shrinks an uncapped oplog without losing merge state: keeps only the latest
+        SET per (table, keys) and, with 'drop_gets', removes GET entries.
+
+        Return Value: Number of removed entries
+        """
+        oplog = self.db[self.oplog_name]
+        try:
+            self.flush()
+            superseded = oplog.aggregate([
+                {"$match": {"operation": "SET"}},
+                {"$sort": {"timestamp": pymongo.DESCENDING}},
+                {"$group": {"_id": {"table": "$table", "keys": "$keys"}, "ids": {"$push": "$_id"}}},
+                {"$project": {"stale": {"$slice": ["$ids", 1, {"$size": "$ids"}]}}},
+                {"$match": {"stale.0": {"$exists": True}}},
+            ], allowDiskUse=True)
+            removed = 0
+            for group in superseded:
+                removed += oplog.delete_many({"_id": {"$in": group["stale"]}}).deleted_count
+            if drop_gets:
+                removed += oplog.delete_many({"operation": "GET"}).deleted_count
+            print(f"Compacted oplog '{self.oplog_name}': removed {removed} entries.")
+            return removed
+        except Exception as e:
+            print(f"Error compacting oplog '{self.oplog_name}': {e}")
+            return None
+
+    def load_data(self, csv_file_path="./dataset/student_course_grades_head.csv", table_name="grades",
+                  chunk_size=10000, workers=1):
         """
         Loads data from a CSV file into the specified MongoDB collection.
         Assumes the first row of the CSV contains headers.
 
+        The file is streamed 'chunk_size' rows at a time and every chunk is written with an
+        unordered insert_many, so memory stays bounded by the chunk size. With 'workers' > 1,
+        up to 'workers' chunks are inserted concurrently. Values are loaded as strings.
+
         Return Value: Length of inserted entries
         """
+        collection = self.db[table_name]
+        inserted = 0
+        start = time.perf_counter()
+
+        def insert_chunk(records):
+            try:
+                return len(collection.insert_many(records, ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                print(f"Error inserting {len(e.details.get('writeErrors', []))} row(s) into '{table_name}'")
+                return e.details.get("nInserted", 0)
+
+        def report(count):
+            elapsed = time.perf_counter() - start
+            rate = count / elapsed if elapsed > 0 else float("inf")
+            print(f"Loaded {count} rows into '{table_name}' ({rate:.0f} rows/sec)")
+
         try:
-            data = pd.read_csv(csv_file_path)
-            collection = self.db[table_name]
-            data_dict = data.to_dict('records')
-            if data_dict:
-                result = collection.insert_many(data_dict)
-                return len(result.inserted_ids)
+            chunks = (chunk.to_dict('records') for chunk in pd.read_csv(csv_file_path, dtype=str, chunksize=chunk_size))
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    in_flight = set()
+                    for records in chunks:
+                        if len(in_flight) >= workers:
+                            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                            inserted += sum(future.result() for future in done)
+                            report(inserted)
+                        in_flight.add(executor.submit(insert_chunk, records))
+                    inserted += sum(future.result() for future in in_flight)
             else:
-                return 0
+                for records in chunks:
+                    inserted += insert_chunk(records)
+                    report(inserted)
+
+            report(inserted)
+            return inserted
         except FileNotFoundError:
             print(f"Error: CSV file not found at {csv_file_path}")
             return None
@@ -69,28 +264,48 @@ class MongoService:
 
 
     def _log_operation(self, log_entry_or_entries):
+        """
+        Logs one entry or a list of entries. Entries are buffered and written
+        with one insert_many once 'log_buffer_size' entries are pending.
+        """
+        entries = log_entry_or_entries if isinstance(log_entry_or_entries, list) else [log_entry_or_entries]
+        if not entries:
+            return
+        if self.oplog_ttl:
+            logged_at = datetime.now(timezone.utc)
+            for entry in entries:
+                entry.setdefault("logged_at", logged_at)
+        with self._log_lock:
+            self._log_buffer.extend(entries)
+            if len(self._log_buffer) < self.log_buffer_size:
+                return
+            pending, self._log_buffer = self._log_buffer, []
+        self._write_log_entries(pending)
+
+    def _write_log_entries(self, entries):
+        """Writes entries with an unordered insert_many, skipping duplicates."""
         log_collection = self.db[self.oplog_name]
         try:
-            if isinstance(log_entry_or_entries, list):
-                if log_entry_or_entries:
-                    for entry in log_entry_or_entries:
-                        try:
-                            log_collection.insert_one(entry)
-                        except DuplicateKeyError:
-                            print(f"Skipped duplicate log entry with timestamp: {entry.get('timestamp')}")
-            else:
-                try:
-                    log_collection.insert_one(log_entry_or_entries)
-                    print("Logged one operation.")
-                except DuplicateKeyError:
-                    print(f"Skipped duplicate log entry with timestamp: {log_entry_or_entries.get('timestamp')}")
+            result = log_collection.insert_many(entries, ordered=False)
+            print(f"Logged {len(result.inserted_ids)} operation(s).")
+        except BulkWriteError as e:
+            report_log_write_error(e, entries, self.oplog_name)
         except Exception as e:
             print(f"Error logging operation(s) to '{self.oplog_name}': {e}")
 
+    def flush(self):
+        """
+        Writes any buffered oplog entries.
+        """
+        with self._log_lock:
+            pending, self._log_buffer = self._log_buffer, []
+        if pending:
+            self._write_log_entries(pending)
+
+    def _flush_periodically(self):
+        while not self._flush_stop.wait(self.log_flush_interval):
+            self.flush()
 
-        
-        
-    
     def _get_timestamp(self):
         return time.time()
 
@@ -162,6 +377,8 @@ class MongoService:
                                           to a replica set member.
         """
         try:
+            # Buffered entries must be visible to readers of the oplog
+            self.flush()
             oplog = self.db[self.oplog_name]
             oplog_query = query if query is not None else {}
             if limit is not None:
@@ -173,35 +390,57 @@ class MongoService:
             print("Ensure you are connected to a member of a MongoDB replica set.")
             return None
 
+    def iter_oplog(self, since=None, operations=None, batch_size=1000, projection=OPLOG_PROJECTION):
+        """
+        Lazily yields oplog entries in timestamp order, fetched from a cursor
+        'batch_size' documents at a time.
 
+        Args:
+            since (int, optional): Only entries with a timestamp greater than this watermark.
+            operations (tuple, optional): Only these operations, e.g. ("SET",).
+            batch_size (int): Documents per cursor batch.
+            projection (dict): Fields to return; defaults to the unified log format
+                               (timestamp, operation, table, keys, item).
+
+        Yields:
+            dict: Oplog entries
+        """
+        # Buffered entries must be visible to readers of the oplog
+        self.flush()
+        oplog_query = {}
+        if since is not None:
+            oplog_query["timestamp"] = {"$gt": since}
+        if operations is not None:
+            oplog_query["operation"] = {"$in": list(operations)}
+
+        cursor = self.db[self.oplog_name].find(oplog_query, projection, batch_size=batch_size)
+        try:
+            for entry in cursor.sort('timestamp', pymongo.ASCENDING):
+                yield entry
+        finally:
+            cursor.close()
 
-    def merge(self,system_name, other_oplog: list):
+    def merge(self,system_name, other_oplog: list, batch_size=1000):
         """
         Merge the custom MongoDB oplog with the operation log from another system (assumed to only contain SET).
         Executes each SET instruction from both logs starting from the timestamp of the
         first instruction in the other oplog.
 
+        The winning SETs are applied with one unordered bulk_write of upserts and one
+        oplog insert_many per chunk of 'batch_size' entries.
+
         Args:
             other_oplog (list): A list of dictionaries representing the operation log from
                                 the other system with "timestamp", "operation" ("SET"),
                                 "table", "keys", and "item".
                                 Sorted in order of timestamps???
-        """
-        def filter_latest_oplog_entries(oplog_entries):
-            latest_entries = {}
-
-            for entry in oplog_entries:
-                # Create a tuple (keys, table) as the unique identifier
-                key = (tuple(sorted(entry['keys'].items())), entry['table'])
-
-                # If not seen before, or if current timestamp is newer, update
-                if key not in latest_entries or entry['timestamp'] > latest_entries[key]['timestamp']:
-                    latest_entries[key] = entry
-
-            # Return just the latest oplog entries as a list
-            return list(latest_entries.values())
-
+            batch_size (int): Number of entries per bulk write.
 
+        Returns:
+            dict: Counts of "applied", "skipped" (not newer than the local state), "superseded"
+                  (replaced by a newer entry for the same key in 'other_oplog') and "failed" entries,
+                  or False if the local oplog could not be read.
+        """
         # Find the timestamp of the first instruction in the other oplog
         other_oplog = list(filter(lambda x: x.get('operation') == 'SET', other_oplog))
         for op in other_oplog:
@@ -209,9 +448,9 @@ class MongoService:
 
         if len(other_oplog) == 0:
             print("No operations found in the other oplog. Exiting.")
-            return True
+            return {"applied": 0, "skipped": 0, "superseded": 0, "failed": 0}
     
-        start_timestamp = sorted(other_oplog, key=lambda x: x.get('timestamp'))[0].get("timestamp")
+        start_timestamp = min(op.get('timestamp') for op in other_oplog)
         oplog = []
 
         oplog = self.get_oplog(query={"operation": "SET", 'timestamp': {'$gte': start_timestamp}})
@@ -220,19 +459,42 @@ class MongoService:
             print(f"Could not retrieve MongoDB custom oplog '{self.oplog_name}' for merging.")
             return False
         
-        oplog.extend(other_oplog)
-
-        oplog = filter_latest_oplog_entries(oplog)
-        print("Filtered: ", oplog)
-
         # Execute SET operations starting from the timestamp of the first other oplog instruction
-        for operation in oplog:
-            if operation.get('_source', 'local') != 'local':
-                print(f"Executing: {operation}")
-                self.set_item(operation['keys'], operation['item'], operation['table'], operation['timestamp'])
+        by_table, superseded = latest_remote_sets(oplog, other_oplog)
+        winners = sum(len(operations) for operations in by_table.values())
+        print(f"Filtered: {winners} winning entries")
+        summary = {"applied": 0, "skipped": len(other_oplog) - superseded - winners,
+                   "superseded": superseded, "failed": 0}
+
+        for table, operations in by_table.items():
+            for start in range(0, len(operations), batch_size):
+                applied, failed = self._apply_set_batch(table, operations[start:start + batch_size])
+                summary["applied"] += applied
+                summary["failed"] += failed
+
+        print(f"Merge operation completed with {system_name} system: {summary}")
+        return summary
+
+    def _apply_set_batch(self, table, operations):
+        """
+        Logs and applies a batch of SET entries on one collection with one bulk oplog
+        insert and one unordered bulk_write.
 
-        print(f"Merge operation completed with {system_name} system.")
-        return True
+        Return Value: (applied, failed)
+        """
+        self._log_operation(set_log_entries(table, operations))
+
+        requests = [UpdateOne(op['keys'], {"$set": op['item']}, upsert=True) for op in operations]
+        try:
+            self.db[table].bulk_write(requests, ordered=False)
+            return len(requests), 0
+        except BulkWriteError as e:
+            failed = len(e.details.get("writeErrors", []))
+            print(f"Error applying {failed} merged SET(s) to '{table}': {e.details.get('writeErrors')}")
+            return len(requests) - failed, failed
+        except Exception as e:
+            print(f"Error applying merged SETs to '{table}': {e}")
+            return 0, len(requests)
 
 
     def drop_collection(self, table_name="grades"):
@@ -253,10 +515,16 @@ class MongoService:
 
     def close(self):
         """
-        Closes the MongoDB connection.
+        Flushes buffered oplog entries and closes the MongoDB connection.
         """
-        if self.client:
+        if getattr(self, "_flush_thread", None):
+            self._flush_stop.set()
+            self._flush_thread.join()
+            self._flush_thread = None
+        if getattr(self, "client", None):
+            self.flush()
             self.client.close()
+            self.client = None
             print("MongoService connection closed.")
 
     def __del__(self):
@@ -1,55 +1,156 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd
-from .db import get_connection
+import psycopg2
+from .db import pooled_connection, get_pool
+from .schema_utils import refresh
 
-def create_table(table_name, csv_path, recreate=False):
+# CSV header -> table column
+CSV_COLUMNS = {
+    "student_id": "student_id",
+    "course_id": "course_id",
+    "roll_no": "roll_no",
+    "email": "email_id",
+    "grade": "grade",
+}
+PRIMARY_KEYS = ["student_id", "course_id"]
+
+
+def _read_csv_chunks(csv_path, chunk_size):
+    """Stream the CSV as DataFrames of at most chunk_size rows, renamed to table columns."""
+    reader = pd.read_csv(csv_path, usecols=list(CSV_COLUMNS), dtype=str, chunksize=chunk_size)
+    for chunk in reader:
+        yield chunk[list(CSV_COLUMNS)].rename(columns=CSV_COLUMNS)
+
+
+def _copy_chunk(cur, target_table, chunk):
+    """Send one chunk to the server with COPY ... FROM STDIN."""
+    buf = io.StringIO()
+    chunk.to_csv(buf, header=False, index=False)
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY {target_table} ({','.join(chunk.columns)}) FROM STDIN WITH (FORMAT csv)",
+        buf
+    )
+    return len(chunk)
+
+
+def _copy_chunk_pooled(target_table, chunk):
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        rows = _copy_chunk(cur, target_table, chunk)
+        conn.commit()
+        cur.close()
+    return rows
+
+
+def _staged_load(cur, conn, table_name, csv_path, chunk_size, workers):
+    """
+    COPY chunks into an unlogged staging table, then move them into the main
+    table with a single INSERT ... SELECT ... ON CONFLICT DO NOTHING, so rows
+    with a duplicate primary key are skipped the same way for any 'workers'.
+    With workers > 1 the chunks are copied concurrently and at most 2 * workers
+    chunks are held in memory at any time.
+
+    Returns (inserted rows, skipped duplicate rows).
+    """
+    # One connection is already held by the caller
+    workers = max(1, min(workers, get_pool().maxconn - 1))
+    staging_table = f"{table_name}_staging"
+    columns = ", ".join(CSV_COLUMNS.values())
+
+    cur.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    cur.execute(f"CREATE UNLOGGED TABLE {staging_table} (LIKE {table_name} INCLUDING DEFAULTS)")
+    conn.commit()
+
+    try:
+        staged = 0
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                in_flight = set()
+                for chunk in _read_csv_chunks(csv_path, chunk_size):
+                    if len(in_flight) >= 2 * workers:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            staged += future.result()
+                    in_flight.add(executor.submit(_copy_chunk_pooled, staging_table, chunk))
+                for future in in_flight:
+                    staged += future.result()
+        else:
+            for chunk in _read_csv_chunks(csv_path, chunk_size):
+                staged += _copy_chunk(cur, staging_table, chunk)
+
+        cur.execute(f"""
+            INSERT INTO {table_name} ({columns})
+            SELECT {columns} FROM {staging_table}
+            ON CONFLICT ({','.join(PRIMARY_KEYS)}) DO NOTHING
+        """)
+        inserted = cur.rowcount
+        conn.commit()
+    finally:
+        # A failed INSERT leaves the transaction aborted; end it before dropping
+        conn.rollback()
+        try:
+            cur.execute(f"DROP TABLE IF EXISTS {staging_table}")
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"Could not drop staging table '{staging_table}': {e}")
+    return inserted, staged - inserted
+
+
+def create_table(table_name, csv_path, recreate=False, chunk_size=100000, workers=1):
     """
     Creates the main table and inserts data from a CSV file only if table is empty.
     Assumes the CSV columns match expected student table schema.
+
+    The CSV is streamed in chunks of chunk_size rows through COPY into a staging
+    table, so memory stays bounded by the chunk size, and merged with
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING. Rows repeating a primary key
+    are skipped and reported. With workers > 1 the chunks are loaded in parallel.
+    Returns the number of rows loaded.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Check if the table already exists
-    if recreate:
-        cur.execute(f""" DROP TABLE IF EXISTS {table_name}""")
-
-    # Create the table
-    cur.execute(f"""
-        CREATE TABLE {table_name} (
-            student_id TEXT,
-            course_id TEXT,
-            roll_no TEXT,
-            email_id TEXT,
-            grade TEXT,
-            PRIMARY KEY (student_id, course_id)
-        )
-    """)
-    conn.commit()
+    with pooled_connection() as conn:
+        cur = conn.cursor()
 
-    # Check if table already has data
-    cur.execute(f"SELECT COUNT(*) FROM {table_name}")
-    row_count = cur.fetchone()[0]
-
-    if row_count == 0:
-        print(f"Table '{table_name}' is empty. Inserting data from CSV...")
-        df = pd.read_csv(csv_path)
-
-        for _, row in df.iterrows():
-            cur.execute(f"""
-                INSERT INTO {table_name} (student_id, course_id, roll_no, email_id, grade)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (
-                row['student_id'],
-                row['course_id'],
-                row['roll_no'],
-                row['email'],
-                row['grade']
-            ))
+        # Check if the table already exists
+        if recreate:
+            cur.execute(f""" DROP TABLE IF EXISTS {table_name}""")
 
+        # Create the table
+        cur.execute(f"""
+            CREATE TABLE {table_name} (
+                student_id TEXT,
+                course_id TEXT,
+                roll_no TEXT,
+                email_id TEXT,
+                grade TEXT,
+                PRIMARY KEY (student_id, course_id)
+            )
+        """)
         conn.commit()
-        print(f"Data has been inserted successfully into '{table_name}'!")
-    else:
-        print(f"Table '{table_name}' already has data. Skipping CSV insertion.")
+        refresh(table_name)
+
+        # Check if table already has data
+        cur.execute(f"SELECT COUNT(*) FROM {table_name}")
+        row_count = cur.fetchone()[0]
+
+        loaded = 0
+        if row_count == 0:
+            print(f"Table '{table_name}' is empty. Inserting data from CSV...")
+            start = time.perf_counter()
+
+            loaded, skipped = _staged_load(cur, conn, table_name, csv_path, chunk_size, workers)
+            if skipped:
+                print(f"Skipped {skipped} CSV rows with a duplicate primary key.")
+
+            elapsed = time.perf_counter() - start
+            rate = loaded / elapsed if elapsed > 0 else float("inf")
+            print(f"Data has been inserted successfully into '{table_name}'! "
+                  f"{loaded} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+        else:
+            print(f"Table '{table_name}' already has data. Skipping CSV insertion.")
 
-    cur.close()
-    conn.close()
+        cur.close()
+    return loaded
@@ -1,8 +1,31 @@
 import psycopg2
+from psycopg2 import pool, extensions
 from dotenv import load_dotenv
+from contextlib import contextmanager
+import csv
+import io
 import os
+import threading
+import time
+
+_config = None
+_pool = None
+_pool_lock = threading.Lock()
+_pool_users = 0
+_slots = None
+_checked_out = {}   # id(conn) -> (slot semaphore, connection)
+_released_at = {}   # id(conn) -> monotonic time of the last release
+
+
+def load_config():
+    """
+    Parse the connection settings from the environment.
+    The environment is only read once; later calls return the cached settings.
+    """
+    global _config
+    if _config is not None:
+        return _config
 
-def get_connection():
     load_dotenv()
     dbname=os.environ.get("DBNAME")
     user=os.environ.get("DBUSER")
@@ -10,10 +33,195 @@ def get_connection():
     port=os.environ.get("PORT")
     if not dbname or not user or not password or not port:
         raise EnvironmentError("DBNAME or USER or PASSWORD or PORT environment variable/s is/are not set")
-    return psycopg2.connect(
-        dbname=dbname,
-        user=user,
-        password=password,
-        host="localhost",
-        port=port
+
+    _config = {
+        "dbname": dbname,
+        "user": user,
+        "password": password,
+        "host": os.environ.get("DBHOST", "localhost"),
+        "port": port,
+        "minconn": int(os.environ.get("POOL_MINCONN", 1)),
+        "maxconn": int(os.environ.get("POOL_MAXCONN", 10)),
+        # Seconds a checkout waits for a free connection
+        "timeout": float(os.environ.get("POOL_TIMEOUT", 30)),
+        # Connections idle for longer than this are pinged before being handed out
+        "ping_after": float(os.environ.get("POOL_PING_AFTER", 30)),
+    }
+    return _config
+
+
+def init_pool(minconn=None, maxconn=None):
+    """
+    Create the shared connection pool if it does not exist yet and return it.
+    Sizes default to POOL_MINCONN / POOL_MAXCONN and only apply when the pool
+    is created; later calls reuse the existing pool.
+    """
+    global _pool, _slots
+    config = load_config()
+    minconn = config["minconn"] if minconn is None else minconn
+    maxconn = config["maxconn"] if maxconn is None else maxconn
+    if minconn < 0 or maxconn < 1 or minconn > maxconn:
+        raise ValueError(f"Invalid pool size: minconn={minconn}, maxconn={maxconn}")
+
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            if maxconn != _pool.maxconn:
+                print(f"Connection pool already open with maxconn={_pool.maxconn}; ignoring maxconn={maxconn}")
+            return _pool
+        _pool = pool.ThreadedConnectionPool(
+            minconn,
+            maxconn,
+            dbname=config["dbname"],
+            user=config["user"],
+            password=config["password"],
+            host=config["host"],
+            port=config["port"]
+        )
+        # getconn() fails instead of waiting when the pool is exhausted
+        _slots = threading.BoundedSemaphore(maxconn)
+        return _pool
+
+
+def get_pool():
+    """Return the shared pool, creating it on first use."""
+    conn_pool = _pool
+    if conn_pool is None or conn_pool.closed:
+        conn_pool = init_pool()
+    return conn_pool
+
+
+def open_pool(minconn=None, maxconn=None):
+    """Register a user of the shared pool (see release_pool) and return the pool."""
+    global _pool_users
+    conn_pool = init_pool(minconn, maxconn)
+    with _pool_lock:
+        _pool_users += 1
+    return conn_pool
+
+
+def release_pool():
+    """Unregister a user of the shared pool; the pool is closed when the last one leaves."""
+    global _pool_users
+    with _pool_lock:
+        _pool_users = max(0, _pool_users - 1)
+        last = _pool_users == 0
+    if last:
+        close_pool()
+
+
+def _is_healthy(conn, ping=False):
+    if conn.closed:
+        return False
+    if conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if ping:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+    return True
+
+
+def get_connection(ping=None):
+    """
+    Check out a connection from the pool, waiting up to POOL_TIMEOUT seconds
+    for one to be released when all maxconn connections are in use.
+    Broken connections are discarded and replaced. Connections idle for more
+    than POOL_PING_AFTER seconds are verified with a round trip to the server
+    (ping=True always pings, ping=False never does).
+    Every checkout must be returned with release_connection().
+    """
+    config = load_config()
+    conn_pool = get_pool()
+    slots = _slots
+    if not slots.acquire(timeout=config["timeout"]):
+        raise pool.PoolError(f"No connection became available within {config['timeout']}s")
+    try:
+        for _ in range(conn_pool.maxconn + 1):
+            conn = conn_pool.getconn()
+            released_at = _released_at.pop(id(conn), None)
+            should_ping = ping if ping is not None else (
+                released_at is not None and time.monotonic() - released_at > config["ping_after"]
+            )
+            if _is_healthy(conn, should_ping):
+                _checked_out[id(conn)] = (slots, conn)
+                return conn
+            conn_pool.putconn(conn, close=True)
+    except BaseException:
+        slots.release()
+        raise
+    slots.release()
+    raise psycopg2.OperationalError("Could not obtain a healthy connection from the pool")
+
+
+def release_connection(conn, discard=False):
+    """Return a connection to the pool, rolling back any unfinished transaction."""
+    slots, _ = _checked_out.pop(id(conn), (None, None))
+    try:
+        if _pool is None or _pool.closed:
+            conn.close()
+            return
+        if not conn.closed and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        discard = discard or conn.closed
+        if not discard:
+            _released_at[id(conn)] = time.monotonic()
+        _pool.putconn(conn, close=discard)
+    finally:
+        if slots is not None:
+            slots.release()
+
+
+@contextmanager
+def pooled_connection(ping=None):
+    """
+    Context manager around get_connection() / release_connection().
+    Uncommitted work is rolled back when the block exits.
+    """
+    conn = get_connection(ping)
+    try:
+        yield conn
+    except psycopg2.OperationalError:
+        release_connection(conn, discard=True)
+        conn = None
+        raise
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+
+def close_pool():
+    """
+    Close every connection held by the shared pool, for process shutdown.
+    Instances sharing the pool should call release_pool() instead.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _released_at.clear()
+
+
+def copy_rows(cur, table_name, columns, rows):
+    """
+    Bulk-load an iterable of row tuples into table_name with COPY ... FROM STDIN.
+    None is sent as NULL. Returns the number of rows sent.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    count = 0
+    for row in rows:
+        writer.writerow(["\\N" if value is None else value for value in row])
+        count += 1
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY {table_name} ({','.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buf
     )
+    return count
@@ -1,29 +1,99 @@
-from .db import get_connection
-from .schema_utils import get_table_schema
+from .db import pooled_connection
+from .schema_utils import get_table_schema, get_primary_keys, refresh
+
+
+def latest_table_name(table_name):
+    return f"{table_name}_latest"
+
 
 def create_log_table(table_name,recreate=False):
-    conn = get_connection()
-    cur = conn.cursor()
-    if recreate:
-        cur.execute(f""" DROP TABLE IF EXISTS {table_name}_log""")
+    """
+    Create <table>_log with a (primary keys, action, action_time) index, and the
+    <table>_latest side table holding the newest SET and GET action_time per key.
+    """
+    log_table = f"{table_name}_log"
+    latest_table = latest_table_name(table_name)
 
+    # Look the metadata up before holding a connection
     schema = get_table_schema(table_name)
-    log_table = f"{table_name}_log"
+    pks = get_primary_keys(table_name)
 
-    # Create column definitions based on the schema
-    col_defs = ", ".join([f"{col} TEXT" for col, _ in schema]) 
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        if recreate:
+            cur.execute(f""" DROP TABLE IF EXISTS {table_name}_log""")
+            cur.execute(f""" DROP TABLE IF EXISTS {latest_table}""")
 
-    extra_cols = "action TEXT, action_time INTEGER"
-    
-    ddl = f"""
-    CREATE TABLE IF NOT EXISTS {log_table} (
-        {col_defs},
-        {extra_cols}
-    );
-    """
+        # Create column definitions based on the schema
+        col_defs = ", ".join([f"{col} TEXT" for col, _ in schema])
+
+        extra_cols = "action TEXT, action_time INTEGER"
+
+        ddl = f"""
+        CREATE TABLE IF NOT EXISTS {log_table} (
+            {col_defs},
+            {extra_cols}
+        );
+        """
 
-    
-    cur.execute(ddl)
-    conn.commit()
-    cur.close()
-    conn.close()
+
+        cur.execute(ddl)
+
+        pk_list = ", ".join(pks)
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {log_table}_key_action_idx
+        ON {log_table} ({pk_list}, action, action_time DESC)
+        """)
+        # Range scans for incremental get_oplog
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {log_table}_action_time_idx
+        ON {log_table} (action_time)
+        """)
+
+        # Latest version per key, consulted by the last-writer-wins checks
+        pk_defs = ", ".join([f"{col} {data_type}" for col, data_type in schema if col in pks])
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {latest_table} (
+            {pk_defs},
+            last_set INTEGER,
+            last_get INTEGER,
+            PRIMARY KEY ({pk_list})
+        )
+        """)
+
+        # Backfill from any history already in the log
+        cur.execute(f"""
+        INSERT INTO {latest_table} ({pk_list}, last_set, last_get)
+        SELECT {pk_list},
+               MAX(action_time) FILTER (WHERE action = 'SET'),
+               MAX(action_time) FILTER (WHERE action = 'GET')
+        FROM {log_table}
+        WHERE {" AND ".join(f"{k} IS NOT NULL" for k in pks)}
+        GROUP BY {pk_list}
+        ON CONFLICT ({pk_list}) DO UPDATE SET
+            last_set = GREATEST({latest_table}.last_set, EXCLUDED.last_set),
+            last_get = GREATEST({latest_table}.last_get, EXCLUDED.last_get)
+        """)
+
+        conn.commit()
+        cur.close()
+    refresh(log_table)
+    refresh(latest_table)
+
+
+def claim_latest(cur, table_name, pks, pk_values, action, action_time):
+    """
+    Record action_time as the newest SET/GET for a key if it is newer than the
+    stored one. The row stays locked until the transaction ends.
+    Returns False when the operation is outdated.
+    """
+    latest_table = latest_table_name(table_name)
+    column = "last_set" if action == "SET" else "last_get"
+    cur.execute(f"""
+    INSERT INTO {latest_table} ({','.join(pks)}, {column})
+    VALUES ({','.join(['%s'] * len(pks))}, %s)
+    ON CONFLICT ({','.join(pks)}) DO UPDATE SET {column} = EXCLUDED.{column}
+    WHERE {latest_table}.{column} IS NULL OR {latest_table}.{column} < EXCLUDED.{column}
+    RETURNING 1
+    """, list(pk_values) + [action_time])
+    return cur.fetchone() is not None
@@ -1,9 +1,9 @@
-from .operations import set_row
-from .schema_utils import get_primary_keys
-from .db import get_connection
+from .db import pooled_connection
+from .operations import apply_set_rows
 
-def merge_log_operations(system_name,log_entries):
-    # Step 1: Build a dictionary to hold the latest log for each unique keys
+
+def _reduce_log(log_entries):
+    """Keep only the latest SET per (table, keys), grouped by table."""
     latest_logs = {}
 
     for entry in log_entries:
@@ -17,7 +17,7 @@ def merge_log_operations(system_name,log_entries):
         external_ts = int(entry["timestamp"])
 
         # Create a unique key for each primary keys set
-        keys_tuple = tuple(sorted(keys.items()))
+        keys_tuple = (table_name, tuple(sorted(keys.items())))
 
         # Store only if:
         # - it's the first time seeing this keys_tuple
@@ -30,39 +30,25 @@ def merge_log_operations(system_name,log_entries):
                 "timestamp": external_ts
             }
 
-    # Step 2: For each latest log, insert/update if necessary
+    by_table = {}
     for info in latest_logs.values():
-        table_name = info["table"]
-        keys = info["keys"]
-        full_row = info["row"]
-        external_ts = info["timestamp"]
-
-        conn = get_connection()
-        cur = conn.cursor()
-
-        # Build WHERE clause from primary keys
-        pks = get_primary_keys(table_name)
-        where_clause = " AND ".join([f"{k} = %s" for k in keys.keys()])
-        values = list(keys.values())
+        by_table.setdefault(info["table"], []).append(info)
+    return by_table
 
-        cur.execute(
-            f"SELECT action_time FROM {table_name}_log WHERE action = 'SET' AND {where_clause} ORDER BY action_time DESC LIMIT 1",
-            values
-        )
-        existing = cur.fetchone()
 
-        update_needed = False
-        if existing:
-            existing_ts = existing[0]
-            if external_ts > existing_ts:
-                update_needed = True
-        else:
-            update_needed = True
-
-        if update_needed:
-            set_row(table_name, full_row, external_ts)
-
-        print(f"Merge operation completed with {system_name} system.")
+def merge_log_operations(system_name,log_entries):
+    # Step 1: Build a dictionary to hold the latest log for each unique keys
+    by_table = _reduce_log(log_entries)
 
+    # Step 2: Apply every table's reduced log set-wise in one transaction
+    applied = 0
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        for table_name, infos in by_table.items():
+            rows = [(info["row"], info["timestamp"]) for info in infos]
+            applied += apply_set_rows(cur, table_name, rows)
+        conn.commit()
         cur.close()
-        conn.close()
+
+    print(f"Merge operation completed with {system_name} system. Applied {applied} SET operations.")
+    return applied
@@ -1,6 +1,6 @@
-from .db import get_connection
-from .schema_utils import get_primary_keys
-from .log_table_manager import create_log_table
+from .db import pooled_connection, copy_rows
+from .schema_utils import get_primary_keys, get_table_schema
+from .log_table_manager import create_log_table, claim_latest, latest_table_name
 
 
 def set_row(table_name, row_dict, action_time):
@@ -8,71 +8,60 @@ def set_row(table_name, row_dict, action_time):
     values = [row_dict[col] for col in cols]
     pks = get_primary_keys(table_name)
 
-    conn = get_connection()
-    cur = conn.cursor()
+    with pooled_connection() as conn:
+        cur = conn.cursor()
 
-    # Build WHERE clause for primary keys to check existing data
-    where_clause = " AND ".join([f"{k} = %s" for k in pks])
-    pk_values = [row_dict[k] for k in pks]
+        # Build WHERE clause for primary keys to check existing data
+        where_clause = " AND ".join([f"{k} = %s" for k in pks])
+        pk_values = [row_dict[k] for k in pks]
 
-    # Check existing latest action_time from log
-    cur.execute(f"""
-    SELECT action_time FROM {table_name}_log 
-    WHERE {where_clause} AND action = 'SET'
-    ORDER BY action_time DESC LIMIT 1
-    """, pk_values)
-    
-    existing_action_time = cur.fetchone()
-
-    if existing_action_time:
-        latest_action_time = existing_action_time[0]
-        if action_time <= latest_action_time:
+        # Claim the key's latest SET version; fails if a newer SET was already applied
+        if not claim_latest(cur, table_name, pks, pk_values, 'SET', action_time):
             print(f"Skipping outdated SET operation for {row_dict} with action_time {action_time}")
+            conn.rollback()
             cur.close()
-            conn.close()
             return
 
-    # --- Fetch existing row from table to fill missing non-PK fields ---
-    cur.execute(f"SELECT * FROM {table_name} WHERE {where_clause}", pk_values)
-    existing_row = cur.fetchone()
-    colnames = [desc[0] for desc in cur.description]
-
-    complete_row = {}
-    if existing_row:
-        db_row = dict(zip(colnames, existing_row))
-        # Fill complete row: prefer new data from row_dict, else from database
-        for col in colnames:
-            if col in row_dict:
-                complete_row[col] = row_dict[col]
-            else:
-                complete_row[col] = db_row[col]
-    else:
-        # No existing row, use only provided data
-        complete_row = row_dict
-
-    # Proceed with UPSERT
-    all_cols = list(complete_row.keys())
-    all_values = [complete_row[col] for col in all_cols]
-    update_set = ", ".join([f"{col} = EXCLUDED.{col}" for col in all_cols])
-
-    insert_sql = f"""
-    INSERT INTO {table_name} ({','.join(all_cols)})
-    VALUES ({','.join(['%s'] * len(all_values))})
-    ON CONFLICT ({','.join(pks)}) DO UPDATE SET
-    {update_set};
-    """
-    cur.execute(insert_sql, all_values)
+        # --- Fetch existing row from table to fill missing non-PK fields ---
+        cur.execute(f"SELECT * FROM {table_name} WHERE {where_clause}", pk_values)
+        existing_row = cur.fetchone()
+        colnames = [desc[0] for desc in cur.description]
 
-    # Log full row (not just partial update!)
-    log_sql = f"""
-    INSERT INTO {table_name}_log ({','.join(all_cols)}, action, action_time)
-    VALUES ({','.join(['%s'] * len(all_values))}, %s, %s)
-    """
-    cur.execute(log_sql, all_values + ['SET', action_time])
+        complete_row = {}
+        if existing_row:
+            db_row = dict(zip(colnames, existing_row))
+            # Fill complete row: prefer new data from row_dict, else from database
+            for col in colnames:
+                if col in row_dict:
+                    complete_row[col] = row_dict[col]
+                else:
+                    complete_row[col] = db_row[col]
+        else:
+            # No existing row, use only provided data
+            complete_row = row_dict
 
-    conn.commit()
-    cur.close()
-    conn.close()
+        # Proceed with UPSERT
+        all_cols = list(complete_row.keys())
+        all_values = [complete_row[col] for col in all_cols]
+        update_set = ", ".join([f"{col} = EXCLUDED.{col}" for col in all_cols])
+
+        insert_sql = f"""
+        INSERT INTO {table_name} ({','.join(all_cols)})
+        VALUES ({','.join(['%s'] * len(all_values))})
+        ON CONFLICT ({','.join(pks)}) DO UPDATE SET
+        {update_set};
+        """
+        cur.execute(insert_sql, all_values)
+
+        # Log full row (not just partial update!)
+        log_sql = f"""
+        INSERT INTO {table_name}_log ({','.join(all_cols)}, action, action_time)
+        VALUES ({','.join(['%s'] * len(all_values))}, %s, %s)
+        """
+        cur.execute(log_sql, all_values + ['SET', action_time])
+
+        conn.commit()
+        cur.close()
 
 def get_row(table_name, filters, action_time):
     """
@@ -81,43 +70,198 @@ def get_row(table_name, filters, action_time):
     """
     where_clause = " AND ".join([f"{col} = %s" for col in filters])
     values = list(filters.values())
+    pks = get_primary_keys(table_name)
 
-    conn = get_connection()
-    cur = conn.cursor()
+    with pooled_connection() as conn:
+        cur = conn.cursor()
     
-    # Check the most recent action_time for the GET operation
-    query = f"""
-    SELECT action_time FROM {table_name}_log 
-    WHERE {where_clause} AND action = 'GET'
-    ORDER BY action_time DESC LIMIT 1
-    """
-    cur.execute(query, values)
-    
-    # Get the latest action_time
-    existing_action_time = cur.fetchone()
+        # Check the most recent action_time for the GET operation
+        if set(filters) == set(pks):
+            is_newer = claim_latest(cur, table_name, pks, [filters[k] for k in pks], 'GET', action_time)
+        else:
+            query = f"""
+            SELECT action_time FROM {table_name}_log 
+            WHERE {where_clause} AND action = 'GET'
+            ORDER BY action_time DESC LIMIT 1
+            """
+            cur.execute(query, values)
+            existing_action_time = cur.fetchone()
+            is_newer = not existing_action_time or action_time > existing_action_time[0]
 
-    # If the action_time is outdated, skip logging the GET operation
-    if existing_action_time:
-        latest_action_time = existing_action_time[0]
-        if action_time <= latest_action_time:
+        # If the action_time is outdated, skip logging the GET operation
+        if not is_newer:
             print(f"Skipping outdated GET operation for {filters}")
+            conn.rollback()
             cur.close()
-            conn.close()
             return 
 
-    # Execute the GET query
-    cur.execute(f"SELECT * FROM {table_name} WHERE {where_clause}", values)
-    result = cur.fetchall()
+        # Execute the GET query
+        cur.execute(f"SELECT * FROM {table_name} WHERE {where_clause}", values)
+        result = cur.fetchall()
+
+        # Log the GET operation
+        filter_cols = list(filters.keys())
+        log_sql = f"""
+        INSERT INTO {table_name}_log ({','.join(filter_cols)}, action, action_time)
+        VALUES ({','.join(['%s'] * len(values))}, %s, %s)
+        """
+        cur.execute(log_sql, values + ['GET', action_time])
+
+        conn.commit()
+        cur.close()
+        return result
+
+
+def _latest_per_key(pks, rows):
+    """Resolve duplicates of the same key within a batch; the newest action_time wins."""
+    latest = {}
+    for row_dict, action_time in rows:
+        key = tuple(row_dict[k] for k in pks)
+        if key not in latest or action_time >= latest[key][1]:
+            latest[key] = (row_dict, action_time)
+    return list(latest.values())
 
-    # Log the GET operation
-    filter_cols = list(filters.keys())
-    log_sql = f"""
-    INSERT INTO {table_name}_log ({','.join(filter_cols)}, action, action_time)
-    VALUES ({','.join(['%s'] * len(values))}, %s, %s)
+
+def apply_set_rows(cur, table_name, rows):
+    """
+    Apply a batch of (row_dict, action_time) SETs without committing.
+    The batch is COPYed into a temp staging table, then a single statement filters
+    it against the _latest table (last writer wins), upserts the surviving rows,
+    writes their SET records to the _log table and advances their latest SET version.
+    Returns the number of applied rows.
     """
-    cur.execute(log_sql, values + ['GET', action_time])
+    pks = get_primary_keys(table_name, cur)
+    columns = [col for col, _ in get_table_schema(table_name, cur)]
+    non_pks = [col for col in columns if col not in pks]
+    staging_table = f"_set_{table_name}"
+    latest_table = latest_table_name(table_name)
+    rows = _latest_per_key(pks, rows)
+    if not rows:
+        return 0
+
+    cur.execute(f"""
+        CREATE TEMP TABLE {staging_table} (LIKE {table_name}) ON COMMIT DROP
+    """)
+    cur.execute(f"""
+        ALTER TABLE {staging_table} ADD COLUMN action_time INTEGER, ADD COLUMN present TEXT[]
+    """)
+
+    # Columns missing from a row keep their current value, as set_row does
+    staged = []
+    for row_dict, action_time in rows:
+        present = [col for col in non_pks if col in row_dict]
+        staged.append(
+            [row_dict.get(col) for col in columns]
+            + [action_time, "{" + ",".join(present) + "}"]
+        )
+    copy_rows(cur, staging_table, columns + ["action_time", "present"], staged)
+
+    # Keep concurrent set_row claims out until the batch commits
+    cur.execute(f"LOCK TABLE {latest_table} IN SHARE ROW EXCLUSIVE MODE")
+
+    pk_list = ", ".join(pks)
+    pk_match_latest_table = " AND ".join([f"v.{k} = s.{k}" for k in pks])
+    pk_match_cur = " AND ".join([f"c.{k} = s.{k}" for k in pks])
+    pk_match_latest = " AND ".join([f"l.{k} = u.{k}" for k in pks])
+    select_cols = ", ".join(
+        [f"s.{k}" for k in pks]
+        + [f"CASE WHEN '{col}' = ANY(s.present) THEN s.{col} ELSE c.{col} END" for col in non_pks]
+    )
+    col_list = ", ".join(columns)
+    update_set = ", ".join([f"{col} = EXCLUDED.{col}" for col in non_pks]) or f"{pks[0]} = EXCLUDED.{pks[0]}"
+
+    cur.execute(f"""
+        WITH latest AS (
+            SELECT s.* FROM {staging_table} s
+            LEFT JOIN {latest_table} v ON {pk_match_latest_table}
+            WHERE v.last_set IS NULL OR v.last_set < s.action_time
+        ),
+        versions AS (
+            INSERT INTO {latest_table} ({pk_list}, last_set)
+            SELECT {pk_list}, action_time FROM latest
+            ON CONFLICT ({pk_list}) DO UPDATE SET
+                last_set = GREATEST({latest_table}.last_set, EXCLUDED.last_set)
+        ),
+        upserted AS (
+            INSERT INTO {table_name} ({col_list})
+            SELECT {select_cols}
+            FROM latest s LEFT JOIN {table_name} c ON {pk_match_cur}
+            ON CONFLICT ({pk_list}) DO UPDATE SET {update_set}
+            RETURNING {col_list}
+        )
+        INSERT INTO {table_name}_log ({col_list}, action, action_time)
+        SELECT {", ".join(f"u.{col}" for col in columns)}, 'SET', l.action_time
+        FROM upserted u JOIN latest l ON {pk_match_latest}
+    """)
+    applied = cur.rowcount
+    cur.execute(f"DROP TABLE {staging_table}")
+    return applied
+
+
+def set_rows(table_name, rows):
+    """
+    Perform a batch of SET operations in one transaction.
+    rows is a list of (row_dict, action_time); returns the number applied.
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        applied = apply_set_rows(cur, table_name, rows)
+        conn.commit()
+        cur.close()
+    return applied
+
+
+def get_rows(table_name, keys_list, action_time):
+    """
+    Perform a batch of GET operations in one transaction and log them.
+    Returns {primary key tuple: rows}; as in get_row, keys whose GET is outdated
+    map to None and are not logged.
+    """
+    pks = get_primary_keys(table_name)
+    keys = list(dict.fromkeys(tuple(filters[k] for k in pks) for filters in keys_list))
+    if not keys:
+        return {}
+
+    staging_table = f"_get_{table_name}"
+    latest_table = latest_table_name(table_name)
+    pk_list = ", ".join(pks)
+    pk_match = " AND ".join([f"t.{k} = c.{k}" for k in pks])
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            CREATE TEMP TABLE {staging_table} AS
+            SELECT {pk_list} FROM {latest_table} WITH NO DATA
+        """)
+        copy_rows(cur, staging_table, pks, keys)
+
+        cur.execute(f"""
+            WITH claimed AS (
+                INSERT INTO {latest_table} ({pk_list}, last_get)
+                SELECT {pk_list}, %s FROM {staging_table}
+                ON CONFLICT ({pk_list}) DO UPDATE SET last_get = EXCLUDED.last_get
+                WHERE {latest_table}.last_get IS NULL OR {latest_table}.last_get < EXCLUDED.last_get
+                RETURNING {pk_list}
+            ),
+            logged AS (
+                INSERT INTO {table_name}_log ({pk_list}, action, action_time)
+                SELECT {pk_list}, 'GET', %s FROM claimed
+            )
+            SELECT {", ".join(f"c.{k}" for k in pks)}, t.*
+            FROM claimed c LEFT JOIN {table_name} t ON {pk_match}
+        """, (action_time, action_time))
+        fetched = cur.fetchall()
+        cur.execute(f"DROP TABLE {staging_table}")
+        conn.commit()
+        cur.close()
 
-    conn.commit()
-    cur.close()
-    conn.close()
-    return result
+    results = {key: None for key in keys}
+    for record in fetched:
+        key = tuple(record[:len(pks)])
+        row = record[len(pks):]
+        if results[key] is None:
+            results[key] = []
+        # Claimed keys without a stored row come back as all-NULL columns
+        if any(value is not None for value in row):
+            results[key].append(row)
+    return results
@@ -1,29 +1,80 @@
-from .db import get_connection
+import threading
+from .db import pooled_connection
+
+# In-process catalog: table name -> {"columns": [(name, type), ...], "primary_keys": [...]}
+_catalog = {}
+_catalog_lock = threading.Lock()
+_catalog_stats = {"hits": 0, "misses": 0}
+
+
+def _load_table_metadata(table_name, cur=None):
+    if cur is None:
+        # Check out a connection only when the caller does not already hold one
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            metadata = _load_table_metadata(table_name, cur)
+            cur.close()
+        return metadata
 
-def get_table_schema(table_name):
-    conn = get_connection()
-    cur = conn.cursor()
     cur.execute(f"""
         SELECT column_name, data_type
         FROM information_schema.columns
         WHERE table_name = %s
+        ORDER BY ordinal_position
     """, (table_name,))
     schema = cur.fetchall()
-    cur.close()
-    conn.close()
-    return schema
 
-def get_primary_keys(table_name):
-    conn = get_connection()
-    cur = conn.cursor()
     cur.execute("""
         SELECT kcu.column_name
         FROM information_schema.table_constraints tc
-        JOIN information_schema.key_column_usage kcu 
+        JOIN information_schema.key_column_usage kcu
         ON tc.constraint_name = kcu.constraint_name
         WHERE tc.table_name = %s AND tc.constraint_type = 'PRIMARY KEY'
+        ORDER BY kcu.ordinal_position
     """, (table_name,))
     pks = [row[0] for row in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return pks
+    return {"columns": schema, "primary_keys": pks}
+
+
+def _get_table_metadata(table_name, cur=None):
+    """
+    Return the cached metadata for a table, loading it on first use.
+    Tables that do not exist yet are not cached, so they are looked up again.
+    A caller that holds a connection passes its cursor, so that a miss does not
+    check out a second connection.
+    """
+    with _catalog_lock:
+        metadata = _catalog.get(table_name)
+        if metadata is not None:
+            _catalog_stats["hits"] += 1
+            return metadata
+        _catalog_stats["misses"] += 1
+
+    metadata = _load_table_metadata(table_name, cur)
+    if metadata["columns"]:
+        with _catalog_lock:
+            _catalog[table_name] = metadata
+    return metadata
+
+
+def get_table_schema(table_name, cur=None):
+    return list(_get_table_metadata(table_name, cur)["columns"])
+
+def get_primary_keys(table_name, cur=None):
+    return list(_get_table_metadata(table_name, cur)["primary_keys"])
+
+def refresh(table_name=None):
+    """
+    Drop cached metadata for one table, or for every table when no name is given.
+    The next lookup reloads it from information_schema.
+    """
+    with _catalog_lock:
+        if table_name is None:
+            _catalog.clear()
+        else:
+            _catalog.pop(table_name, None)
+
+def catalog_stats():
+    """Return the catalog hit/miss counters and the number of cached tables."""
+    with _catalog_lock:
+        return {**_catalog_stats, "tables": len(_catalog)}
@@ -1,18 +1,20 @@
-from .db import get_connection
-from .schema_utils import get_primary_keys, get_table_schema
-from .operations import set_row, get_row
+from .db import open_pool, release_pool, pooled_connection
+from .schema_utils import get_primary_keys, get_table_schema, refresh, catalog_stats
+from .operations import set_row, get_row, set_rows, get_rows
 from .merger import merge_log_operations
 from .log_table_manager import create_log_table
 from .create_database import create_table
 
 class SQL:
-    def __init__(self, table_name):
+    def __init__(self, table_name, minconn=None, maxconn=None):
         self.table_name = table_name
-        self.conn = get_connection()
+        # The pool is shared by every SQL instance; sizes apply to the first one
+        open_pool(minconn, maxconn)
+        self._pool_open = True
 
-    def create_table(self, csv_path, recreate=False):
-        """Create the table and insert CSV data."""
-        create_table(self.table_name, csv_path,recreate)
+    def create_table(self, csv_path, recreate=False, chunk_size=100000, workers=1):
+        """Create the table and bulk-load CSV data with COPY."""
+        return create_table(self.table_name, csv_path, recreate, chunk_size, workers)
 
     def create_log_table(self,recreate=False):
         """Create log table for the specified table."""
@@ -29,68 +31,121 @@ class SQL:
         print("Rows fetched (SQL):", rows)
         return rows
 
+    def set_many(self, ops):
+        """
+        Perform a batch of SET operations in one transaction.
+        ops is a list of (keys, item, action_time); duplicates of a key within
+        the batch are resolved before reaching the database.
+        Returns the number of applied SETs.
+        """
+        rows = [({**keys, **item}, action_time) for keys, item, action_time in ops]
+        return set_rows(self.table_name, rows)
+
+    def get_many(self, keys, action_time):
+        """
+        Perform a batch of GET operations in one transaction and log them.
+        Returns {primary key tuple: rows}, with None for outdated GETs.
+        """
+        rows = get_rows(self.table_name, keys, action_time)
+        print("Rows fetched (SQL):", rows)
+        return rows
+
     def merge(self, system_name, external_logs):
         """Merge SET operations from external log entries."""
-        merge_log_operations(system_name,external_logs)
+        return merge_log_operations(system_name,external_logs)
 
     def show_table(self, table_name=None):
         """Prints the contents of the specified table."""
         if table_name is None:
             table_name = self.table_name
 
-        cur = self.conn.cursor()
-        cur.execute(f"SELECT * FROM {table_name}")
-        rows = cur.fetchall()
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT * FROM {table_name}")
+            rows = cur.fetchall()
+            cur.close()
 
         for row in rows:
             print(row)
 
-        cur.close()
-
     def show_log_table(self):
         """Prints the contents of the log table for the specified table."""
         log_table_name = f"{self.table_name}_log"
         
-        cur = self.conn.cursor()
-        cur.execute(f"SELECT * FROM {log_table_name}")
-        rows = cur.fetchall()
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT * FROM {log_table_name}")
+            rows = cur.fetchall()
+            cur.close()
 
         print(f"Contents of the log table ({log_table_name}):")
         for row in rows:
             print(row)
 
-        cur.close()
-    def get_oplog(self):
-        """Returns the log table records in a structured format for merging."""
-        log_table_name = f"{self.table_name}_log"
-
-        cur = self.conn.cursor()
-        cur.execute(f"SELECT * FROM {log_table_name}")
-        rows = cur.fetchall()
+    def get_oplog(self, since=None, until=None, operations=("SET",), batch_size=1000):
+        """
+        Yields log table records in a structured format for merging, oldest first.
 
-        colnames = [desc[0] for desc in cur.description]
+        Only records with since < action_time <= until and an action in
+        operations are sent (operations=None yields every action). Rows are
+        streamed from a server-side cursor batch_size at a time.
+        """
+        log_table_name = f"{self.table_name}_log"
         primary_keys = get_primary_keys(self.table_name)
 
-        logs = []
-        for row in rows:
-            record = dict(zip(colnames, row))
-
-            # Separate into keys and item
-            keys = {k: record[k] for k in primary_keys if k in record}
-            item = {k: record[k] for k in record if k not in primary_keys and k not in ['action', 'action_time']}
-
-            structured_log = {
-                'timestamp': record['action_time'],
-                'operation': record['action'],
-                'table': self.table_name,
-                'keys': keys,
-                'item': item
-            }
-            logs.append(structured_log)
-
-        cur.close()
-        return logs
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append("action_time > %s")
+            params.append(since)
+        if until is not None:
+            conditions.append("action_time <= %s")
+            params.append(until)
+        if operations is not None:
+            conditions.append("action = ANY(%s)")
+            params.append(list(operations))
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with pooled_connection() as conn:
+            cur = conn.cursor(name=f"{log_table_name}_oplog")
+            cur.itersize = batch_size
+            cur.execute(f"SELECT * FROM {log_table_name} {where_clause} ORDER BY action_time", params)
+
+            colnames = None
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                if colnames is None:
+                    colnames = [desc[0] for desc in cur.description]
+
+                for row in rows:
+                    record = dict(zip(colnames, row))
+
+                    # Separate into keys and item
+                    keys = {k: record[k] for k in primary_keys if k in record}
+                    item = {k: record[k] for k in record if k not in primary_keys and k not in ['action', 'action_time']}
+
+                    yield {
+                        'timestamp': record['action_time'],
+                        'operation': record['action'],
+                        'table': self.table_name,
+                        'keys': keys,
+                        'item': item
+                    }
+
+            cur.close()
+
+    def refresh_catalog(self, table_name=None):
+        """Invalidate cached schema / primary-key metadata."""
+        refresh(table_name)
+
+    def catalog_stats(self):
+        """Return hit/miss counters of the schema catalog."""
+        return catalog_stats()
 
     def close(self):
-        """Close the database connection."""
-        self.conn.close()
+        """Stop using the shared pool; it is closed once every SQL instance has been closed."""
+        if self._pool_open:
+            self._pool_open = False
+            release_pool()
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("dotenv")
+pytest.importorskip("pandas")
+
+from mongo.async_mongo_service import AsyncMongoService
+
+
+def _matches(document, query):
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict):
+            if "$gt" in condition and not value > condition["$gt"]:
+                return False
+            if "$gte" in condition and not value >= condition["$gte"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+        self.closed = False
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.documents)
+
+    def __aiter__(self):
+        self._position = 0
+        return self
+
+    async def __anext__(self):
+        if self._position >= len(self.documents):
+            raise StopAsyncIteration
+        self._position += 1
+        return self.documents[self._position - 1]
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+        self.bulk_writes = []
+        self.cursors = []
+
+    async def create_index(self, keys, **kwargs):
+        return "index"
+
+    async def insert_many(self, documents, ordered=True):
+        self.documents.extend(dict(document) for document in documents)
+
+    async def bulk_write(self, requests, ordered=True):
+        self.bulk_writes.append(requests)
+
+    def find(self, query=None, projection=None, batch_size=None):
+        cursor = FakeCursor([dict(d) for d in self.documents if _matches(d, query or {})])
+        self.cursors.append(cursor)
+        return cursor
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+
+class FakeClient(dict):
+    closed = False
+
+    def __missing__(self, name):
+        self[name] = FakeDatabase()
+        return self[name]
+
+    def close(self):
+        self.closed = True
+
+
+def _set(timestamp, student, grade, table="grades"):
+    return {"timestamp": timestamp, "operation": "SET", "table": table,
+            "keys": {"student_ID": student}, "item": {"grade": grade}}
+
+
+def test_merge_applies_only_newer_remote_sets():
+    client = FakeClient()
+    service = AsyncMongoService(client=client)
+    oplog = client["project"]["oplog"]
+    oplog.documents.append(_set(5, "S1", "A"))
+
+    remote = [_set(3, "S1", "B"), _set(6, "S2", "D"), _set(7, "S2", "C"),
+              {"timestamp": 8, "operation": "GET", "table": "grades"}]
+    summary = asyncio.run(service.merge("HIVE", remote))
+
+    assert summary == {"applied": 1, "skipped": 1, "superseded": 1, "failed": 0}
+    assert len(client["project"]["grades"].bulk_writes) == 1
+    assert [entry["timestamp"] for entry in oplog.documents] == [5, 7]
+    assert "_source" not in oplog.documents[-1]
+
+
+def test_iter_oplog_closes_cursor_when_consumer_stops_early():
+    client = FakeClient()
+    service = AsyncMongoService(client=client)
+    oplog = client["project"]["oplog"]
+    oplog.documents.extend(_set(timestamp, f"S{timestamp}", "A") for timestamp in range(1, 6))
+
+    async def first_after(since):
+        entries = service.iter_oplog(since=since, operations=("SET",))
+        try:
+            async for entry in entries:
+                return entry
+        finally:
+            await entries.aclose()
+
+    entry = asyncio.run(first_after(2))
+
+    assert entry["timestamp"] == 3
+    assert oplog.cursors[-1].closed
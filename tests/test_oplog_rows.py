@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("pyhive")
+
+from hive.better_hive_service import (
+    COLLECTION_DELIM, FIELD_DELIM, HIVE_NULL, MAP_KEY_DELIM, OplogManager, to_text_row,
+)
+
+
+def _split_unescaped(text, delim):
+    """Split on delim where it is not escaped, keeping the escapes for _unescape."""
+    parts, current, position = [], [], 0
+    while position < len(text):
+        char = text[position]
+        if char == "\\" and position + 1 < len(text):
+            current.append(text[position:position + 2])
+            position += 2
+            continue
+        if char == delim:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+        position += 1
+    parts.append("".join(current))
+    return parts
+
+
+def _unescape(text):
+    out, position = [], 0
+    while position < len(text):
+        char = text[position]
+        if char == "\\" and position + 1 < len(text):
+            escaped = text[position + 1]
+            out.append({"n": "\n", "r": "\r"}.get(escaped, escaped))
+            position += 2
+        else:
+            out.append(char)
+            position += 1
+    return "".join(out)
+
+
+def _hive_read(line, legacy=False):
+    """
+    Read a to_text_row line back the way Hive's delimited SerDe does, and return
+    the MAP (or legacy ARRAY) columns as the JSON text a SELECT hands to the client.
+    """
+    timestamp, operation, table_name, keys, item = _split_unescaped(line.rstrip("\n"), FIELD_DELIM)
+
+    def collection(field):
+        if field == HIVE_NULL:
+            return None
+        entries = _split_unescaped(field, COLLECTION_DELIM) if field else []
+        if legacy:
+            return json.dumps([_unescape(entry) for entry in entries])
+        return json.dumps(dict(
+            (_unescape(key), _unescape(value))
+            for key, value in (_split_unescaped(entry, MAP_KEY_DELIM) for entry in entries)
+        ))
+
+    return (int(timestamp), _unescape(operation), _unescape(table_name), collection(keys), collection(item))
+
+
+def test_map_rows_round_trip_values_with_delimiters_and_escapes():
+    keys = {"student_id": "S:1", "course_id": 'C"01\''}
+    item = {"grade": "A: \"excellent\"\nsee C:\\notes\\x\rend", "note": "\x01\x02\x03"}
+    line = to_text_row((12, "SET", "grades", keys, item))
+
+    assert line.count("\n") == 1
+    assert OplogManager.rows_to_entries([_hive_read(line)]) == [
+        {"timestamp": 12, "operation": "SET", "table": "grades", "keys": keys, "item": item},
+    ]
+
+
+def test_empty_and_null_maps_decode_to_empty_dicts():
+    rows = [_hive_read(to_text_row((3, "GET", "grades", {"student_id": "S1"}, {}))),
+            _hive_read(to_text_row((4, "GET", "grades", {"student_id": "S2"}, None)))]
+
+    assert [entry["item"] for entry in OplogManager.rows_to_entries(rows)] == [{}, {}]
+
+
+def test_legacy_array_rows_split_on_the_first_colon_only():
+    line = to_text_row((5, "SET", "grades",
+                        ["grades.student_id: S:1", "course_id: C1"],
+                        ['grade: "A": top', "comment: a\\b"]))
+
+    assert OplogManager.rows_to_entries([_hive_read(line, legacy=True)]) == [{
+        "timestamp": 5, "operation": "SET", "table": "grades",
+        "keys": {"student_id": "S:1", "course_id": "C1"},
+        "item": {"grade": '"A": top', "comment": "a\\b"},
+    }]
+
+
+def test_undecodable_rows_are_skipped():
+    good = _hive_read(to_text_row((1, "SET", "grades", {"student_id": "S1"}, {"grade": "A"})))
+    rows = [good, (2, "SET", "grades", '{"student_id": ', "{}"), (3, "SET", "grades", "42", "{}")]
+
+    entries = OplogManager.rows_to_entries(rows)
+
+    assert [entry["timestamp"] for entry in entries] == [1]
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("pyhive")
+
+from hive.better_hive_service import CompactTimestampCache, TimestampCache
+
+
+def _keys(count, seed=7):
+    rng = random.Random(seed)
+    return [(f"SID{rng.randrange(count * 2)}", f"CSE{rng.randrange(50):03d}") for _ in range(count)]
+
+
+def test_compact_cache_matches_dict_cache_through_growth():
+    reference, compact = TimestampCache(), CompactTimestampCache(capacity=8)
+    keys = _keys(5000)
+    for timestamp, key in enumerate(keys):
+        reference.set(key, timestamp)
+        compact.set(key, timestamp)
+
+    assert len(compact) == len(reference)
+    assert len(compact._keys) > 8
+    assert sorted(compact.items()) == sorted(reference.items())
+
+    probes = keys[::7] + [("SID-missing", "CSE000"), ("SID1", "CSE-missing")]
+    assert compact.get_many(probes) == reference.get_many(probes)
+    assert compact.get_many(probes, default=None) == reference.get_many(probes, default=None)
+    for key in probes:
+        assert compact.get(key, -5) == reference.get(key, -5)
+
+
+def test_compact_cache_overwrites_and_coerces_timestamps():
+    compact = CompactTimestampCache()
+    compact.set(("SID1", "CSE001"), 3)
+    compact.set(("SID1", "CSE001"), 9.0)
+
+    assert compact.get(("SID1", "CSE001")) == 9
+    assert isinstance(compact.get(("SID1", "CSE001")), int)
+    assert len(compact) == 1
+
+
+def test_compact_cache_clear():
+    compact = CompactTimestampCache()
+    for timestamp, key in enumerate(_keys(100)):
+        compact.set(key, timestamp)
+    compact.clear()
+
+    assert len(compact) == 0
+    assert list(compact.items()) == []
+    assert compact.get(("SID1", "CSE001")) == -1
+
+    # The arity is chosen again by the first key after clear()
+    compact.set(("SID1",), 4)
+    assert compact.get(("SID1",)) == 4
+
+
+def test_compact_cache_rejects_keys_of_another_arity():
+    compact = CompactTimestampCache()
+    compact.set(("SID1", "CSE001"), 1)
+
+    with pytest.raises(ValueError):
+        compact.set(("SID1",), 2)
+    with pytest.raises(ValueError):
+        compact.get(("SID1", "CSE001", "extra"))
+
+
+def test_compact_cache_overflows_when_a_key_position_runs_out_of_ids():
+    # 32 components leave one bit per position: two distinct values each
+    compact = CompactTimestampCache()
+    base = tuple(f"c{position}" for position in range(32))
+    compact.set(base, 1)
+    compact.set(("other",) + base[1:], 2)
+
+    with pytest.raises(OverflowError):
+        compact.set(("third",) + base[1:], 3)
+    assert compact.get(base) == 1
+    assert len(compact) == 2